@@ -1,3 +1,4 @@
+import io
 import os
 import json
 import uuid
@@ -5,262 +6,254 @@ import logging
 from logging.handlers import RotatingFileHandler
 
 import dspy
-from docx import Document
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-import boto3
-from flask import Flask, request
+from botocore.exceptions import ClientError
+from flask import Flask, Response, request
 from flask_cors import CORS
 
+from cache import get_cache
+from checkpoint import get_checkpoints, plan_hash
+from coalesce import SingleFlight
+from course import Course
+from jobs import JobQueue, QueueFull
+from llm import InstrumentedOpenAI, predict
+from metrics import course, exposition, span, tags
+from outline import parse_objectives, parse_outline
+from renderers import render
+from reuse import reuse_stats
+from routing import DEFAULT_MODEL
+from service import Promot2Outline, outline_prompt, unit_tasks
+from storage import (
+    S3_BUCKET,
+    ArtifactUploader,
+    download_bytes,
+    upload_fileobj,
+    upload_in_background,
+)
+
 app = Flask(__name__)
 CORS(app)
 
 log_formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
 file_handler = RotatingFileHandler("app.log", maxBytes=1024 * 1024 * 10, backupCount=10)
 file_handler.setFormatter(log_formatter)
-app.logger.addHandler(file_handler)
+# On the root logger so the shared modules (metrics, jobs, storage) log too.
+logging.getLogger().addHandler(file_handler)
 app.logger.setLevel(logging.INFO)
+logging.getLogger("metrics").setLevel(logging.INFO)
 
-gpt4 = dspy.OpenAI(model="gpt-3.5-turbo", max_tokens=4000, model_type="chat")
+gpt4 = InstrumentedOpenAI(model=DEFAULT_MODEL, max_tokens=4000, model_type="chat")
 dspy.settings.configure(lm=gpt4)
 
+jobs = JobQueue()
+courses = SingleFlight("course")
+
+DEBUG_DOCX_PATH = os.getenv("DEBUG_DOCX_PATH")
+
 
 def parse_course_outline(data):
     course_data = json.loads(data)
-    outlines = course_data["outlines"]
-    units = outlines.rstrip("\n").split("\n\n")
-    unit_list = []
-    for i, unit in enumerate(units, start=1):
-        title, description, *objectives = unit.splitlines(keepends=True)
-        title = title.strip()
-        description = description.strip()
-        objectives = [objective.strip() for objective in objectives]
-        unit_dict = {
-            "unit_number": i,
-            "title": title,
-            "description": description,
-            "objectives": objectives,
-        }
-        unit_list.append(unit_dict)
-
-    return unit_list
+    return parse_outline(course_data["outlines"])
 
 
 def update_objectives(objectives):
-    updated_objectives = []
-    for obj in objectives[1:]:
-        objective_number, description = obj.split(". ", 1)
-        description = description.strip()
-        updated_objective = {
-            "objective_number": int(objective_number),
-            "description": description,
-        }
-        updated_objectives.append(updated_objective)
-
-    return updated_objectives
+    return parse_objectives(objectives)
 
 
 def create_course_outline(
     units, output_file, bucket_name, s3_key, heading, description, outcomes
 ):
+    """Renders the course to DOCX in memory and uploads it to S3.
+
+    The course is uploaded as JSON too, under the same key with a ``.json``
+    extension, so it can be rendered to other formats later without the LM.
+    Only the DOCX upload is waited for; the JSON is sent in the background.
+    ``output_file`` is optional; when set, a copy of the DOCX is also written
+    there so the document can be inspected locally.
+    """
     app.logger.info("uploading to s3")
-    doc = Document()
-    doc.add_heading(f"Course name: {heading}", level=1).paragraph_format.alignment = (
-        WD_PARAGRAPH_ALIGNMENT.CENTER
-    )
-    for paragraph in doc.paragraphs:
-        if f"Course name: {heading}" in paragraph.text:
-            for run in paragraph.runs:
-                run.font.underline = True
-    doc.add_heading("Course Description:", level=2)
-    doc.add_paragraph(description)
-    doc.add_heading("Course Outcomes:", level=2)
-    doc.add_paragraph(outcomes)
-    for unit in units:
-        doc.add_heading(unit["title"], level=1)
-        if "description" in unit:
-            doc.add_paragraph(unit["description"])
-        if "objectives" in unit:
-            for objective in unit["objectives"]:
-                doc.add_heading(f"Objective {objective['objective_number']}", level=2)
-                doc.add_paragraph(objective["content"])
-                if "terms_nd_definition" in objective:
-                    doc.add_heading("Terms and Definitions", level=3)
-                    doc.add_paragraph(objective["terms_nd_definition"])
-
-        for section in ["assessment", "questions", "learning_activity", "project"]:
-            if section in unit:
-                doc.add_heading(section.capitalize().replace("_", " "), level=2)
-                doc.add_paragraph(unit[section])
-    doc.save(output_file)
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
-    s3.upload_file(output_file, bucket_name, s3_key)
-
-
-class Promot2Outline(dspy.Signature):
-    prompt = dspy.InputField()
-    course_outline = dspy.OutputField(
-        desc="""For each unit,
-            create a unit NAME, DESCRIPTION, and a list of 2-3 OBJECTIVES for /
-            each unit. The unit description should be 1-2 paragraphs. /
-            Refer to the students as “students”. The Result must start /
-              with a Bloom’s verb and be measurable and specific. /
-              The tone should have an active and engaging tone.
-            Divide the course info into the exact number of number_of_weeks,
-            Generate for all number of weeks specified, do not shorten the /
-            response
-            Don't add trailing comments. just returning the units is okay
-            """
-    )
+    generated = Course.from_units(units, heading, description, outcomes)
+    with span("docx_render"):
+        body, content_type, _ = render(generated, "docx")
+    if output_file:
+        with open(output_file, "wb") as f:
+            f.write(body)
+    json_body, json_type, _ = render(generated, "json")
+    json_key = f"{os.path.splitext(s3_key)[0]}.json"
+    upload_in_background(json_body, bucket_name, json_key, json_type)
+    with span("s3_upload"):
+        upload_fileobj(io.BytesIO(body), bucket_name, s3_key, content_type)
 
 
-class UnitIntroduction(dspy.Signature):
-    prompt = dspy.InputField()
-    unit_description = dspy.OutputField(
-        desc="""Create a 2-3 paragraph unit introduction discussing /
-          what students will learn in the unit.
-          Discuss why this information is important and how it relates to /
-          their future career in computer science."""
-    )
+@app.route("/")
+def home():
+    return "Hello Outline Generator"
 
 
-class ObjectiveContent(dspy.Signature):
-    objective = dspy.InputField()
-    course_content = dspy.OutputField(
-        desc="""Provide students with detailed information about how to learn /
-        about this objective. Be very detailed and specific in the response.
-        Provide all important information students must know to understand /
-        this unit outcomes. Include any links to open source resources or /
-        Internet resources that are available on this topic.
-        Provide the URL to all links and resources."""
-    )
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    body, content_type = exposition()
+    return Response(body, content_type=content_type)
 
 
-class Discussion4Objective(dspy.Signature):
-    objective = dspy.InputField()
-    discussion_questions = dspy.OutputField(
-        desc="""Create a discussion question that relates to the unit /
-        objective of <Unit xx objective xx> Whenever possible, /
-        have students apply the concepts to their personal lives or careers."""
-    )
+@app.route("/cache", methods=["GET"])
+def cache_stats():
+    return {**get_cache().stats(), "similar_objectives": reuse_stats()}
 
 
-class TermsndDefinitions(dspy.Signature):
-    objective = dspy.InputField()
-    terms_and_definition = dspy.OutputField(
-        desc="""Create a list of terms and definitions related to objective"""
+@app.route("/courses/<course_id>.<format>", methods=["GET"])
+def export_course(course_id, format):
+    """Renders a generated course in another format without calling the LM."""
+    try:
+        text = download_bytes(S3_BUCKET, f"{course_id}.json")
+        body, content_type, extension = render(Course.from_json(text), format)
+    except ClientError as e:
+        app.logger.warning(f"Course {course_id} not found: {e}")
+        return {"error": f"Unknown course {course_id}"}, 404
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    return Response(
+        body,
+        content_type=content_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{course_id}.{extension}"'
+        },
     )
 
 
-class LearningActivity(dspy.Signature):
-    objective = dspy.InputField()
-    learning_activity = dspy.OutputField(
-        desc="""Create 1 learning activity to /
-        practice the objective"""
-    )
+def generate_unit(unit, checkpoint, use_cache=True):
+    """Generates every section of a unit and its objectives, one call at a time.
+
+    Each result is saved to ``checkpoint`` and reused if the course is retried.
+    """
+    piece = f"unit{unit['unit_number']}"
+    for target, key, fn, inputs in unit_tasks(unit, use_cache):
+        section = f"{piece}.{key}"
+        if target is not unit:
+            section = f"{piece}.objective{target['objective_number']}.{key}"
+        target[key] = checkpoint.call(section, fn, **inputs)
+    return unit
+
+
+def iter_course(lesson_plan, use_cache=True, upload_artifacts=None):
+    """Generates a course outline, reporting progress as it goes.
+
+    Yields ``("outline", units)`` once the outline is parsed, ``("unit", unit)``
+    as each unit is completed and finally ``("done", url)``. With
+    ``upload_artifacts`` the outline and finished units are also uploaded as
+    JSON in the background while generation continues.
+    """
+    course_name = lesson_plan.get("course_name")
+    course_description = lesson_plan.get("course_description")
+    course_outcomes = lesson_plan.get("course_outcomes")
+    app.logger.info("data retrieved, constructing prompt")
+    prompt = outline_prompt(lesson_plan)
+    course_id = str(uuid.uuid4())
+    checkpoint = get_checkpoints().course(plan_hash(lesson_plan), resume=use_cache)
+    artifacts = ArtifactUploader(S3_BUCKET, course_id, upload_artifacts)
+    with course(course_id), artifacts:
+        app.logger.info("generating outline")
+        response = checkpoint.call(
+            "outline",
+            predict,
+            Promot2Outline,
+            "course_outline",
+            use_cache=use_cache,
+            prompt=prompt,
+        )
+        app.logger.info("parsing the response")
+        app.logger.info(f"response: {response}")
+        with span("outline_parse"):
+            result = parse_course_outline(json.dumps({"outlines": response}))
+        artifacts.put_json("outline.json", result)
+        app.logger.info("adding introduction")
+        yield "outline", result
+        for unit in result:
+            with tags(unit=unit["unit_number"]):
+                generate_unit(unit, checkpoint, use_cache)
+            artifacts.put_json(f"units/{unit['unit_number']}.json", unit)
+            yield "unit", unit
+        key = f"{course_id}.docx"
+        create_course_outline(
+            result,
+            DEBUG_DOCX_PATH,
+            S3_BUCKET,
+            key,
+            course_name,
+            course_description,
+            course_outcomes,
+        )
+    checkpoint.clear()
+    yield "done", f"dzrsteit2h2vm.cloudfront.net/{key}"
 
 
-class ObjectiveQuestions(dspy.Signature):
-    objective = dspy.InputField()
-    objective_questions_25 = dspy.OutputField(
-        desc="""Create a 25-question objective test based on this unit’s /
-        content that relates to the following objectives /
-        in the input. Provide the answer key and rubric."""
+def run_generation(job, lesson_plan, use_cache=True, upload_artifacts=None):
+    """Runs ``iter_course`` for a job, or follows the identical course another
+    job is already generating and ends with the same URL."""
+    events = courses.stream(
+        (plan_hash(lesson_plan), use_cache),
+        lambda: iter_course(lesson_plan, use_cache, upload_artifacts),
     )
-
-
-class ObjectiveProject(dspy.Signature):
-    objective = dspy.InputField()
-    project = dspy.OutputField(
-        desc="""Create a project that students need to complete related /
-        to the objectives. The project can be a paper, presentation, /
-        research, designing a product/service, etc. Provide a rubric /
-        and answer key."""
+    for event, payload in events:
+        if event == "outline":
+            job.start(len(payload))
+            job.publish("outline", {"units_total": len(payload)})
+        elif event == "unit":
+            job.advance()
+            job.publish("unit", payload)
+        elif event == "done":
+            url = payload
+    return url
+
+
+def stream_job(job):
+    """Renders a job's events as server-sent events, ending with its status."""
+    for item in job.stream(heartbeat=15):
+        if item is None:
+            yield ": keep-alive\n\n"
+            continue
+        event, data = item
+        yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+
+
+def wants_stream():
+    return (
+        request.args.get("stream") in ("1", "true")
+        or request.accept_mimetypes.best == "text/event-stream"
     )
 
 
-@app.route("/")
-def home():
-    return "Hello Outline Generator"
+def event_stream_response(job):
+    return Response(
+        stream_job(job),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Job-Id": job.id},
+    )
 
 
 @app.route("/generate", methods=["POST"])
 def generate_question():
-    """Generates a outline from the provided context using dspy."""
+    """Queues outline generation for the provided context and returns its job.
+
+    With ``?stream=1`` or ``Accept: text/event-stream`` the response instead
+    streams each unit as a server-sent event once its sections are generated.
+    """
     try:
         data = request.json
         app.logger.info(f"Received request {data}")
         lesson_plan = data.get("lesson_plan")
-        grade_level = lesson_plan.get("grade_level")
-        subject = lesson_plan.get("subject")
-        course_name = lesson_plan.get("course_name")
-        course_description = lesson_plan.get("course_description")
-        course_outcomes = lesson_plan.get("course_outcomes")
-        number_of_weeks = lesson_plan.get("number_of_weeks")
-        app.logger.info("data retrieved, constructing prompt")
-        prompt = f"""
-            <complete_response>
-            You are an instructional designer and faculty member for a school /
-            teaching {grade_level} {subject} courses.
-            You are developing a "{grade_level}" level {subject} /
-            course called {course_name}. The course description is /
-            {course_description}.
-            The outcomes of the course include {course_outcomes}
-            Based on this information, you will divide this course into /
-            {number_of_weeks} units. return complete response for the total division
-        """
-        app.logger.info("generating outline")
-        response = dspy.ChainOfThought(Promot2Outline)(prompt=prompt).course_outline
-        app.logger.info("parsing the response")
-        app.logger.info(f"response: {response}")
-        result = parse_course_outline(json.dumps({"outlines": response}))
-        app.logger.info("adding introduction")
-        for unit in result:
-            unit_prompt = f"""
-                Unit {unit['unit_number']} will cover the following topics: {unit['description']}
-                The unit {unit['unit_number']} objectives are: {unit['objectives']}
-            """
-            unit["introduction"] = dspy.ChainOfThought(UnitIntroduction)(
-                prompt=unit_prompt
-            ).unit_description
-            unit["objectives"] = update_objectives(unit["objectives"])
-            unit["learning_activity"] = dspy.ChainOfThought(LearningActivity)(
-                objective=f"""As a student, I need a hands-on practice /
-                activity that directly engages me in practicing each of the /
-                specified objectives: {unit['objectives']}"""
-            ).learning_activity
-            unit["questions"] = dspy.ChainOfThought(Discussion4Objective)(
-                objective=f"{unit['objectives']}"
-            ).discussion_questions
-            unit["assessment"] = dspy.ChainOfThought(ObjectiveQuestions)(
-                objective=f"{unit['objectives']}"
-            ).objective_questions_25
-            unit["project"] = dspy.ChainOfThought(ObjectiveProject)(
-                objective=f"{unit['objectives']}"
-            ).project
-            for objective in unit["objectives"]:
-                objective["content"] = dspy.ChainOfThought(ObjectiveContent)(
-                    objective=f"""Next you will /
-                    create the course content for {unit['unit_number']} /
-                    One of the objectives is to {objective['description']}.""",
-                ).course_content
-                objective["terms_nd_definition"] = dspy.ChainOfThought(
-                    TermsndDefinitions
-                )(objective=objective["description"]).terms_and_definition
-        key = f"{str(uuid.uuid4())}.docx"
-        create_course_outline(
-            result,
-            "course_outline.docx",
-            "dev-vecul-media-assets",
-            key,
-            course_name,
-            course_description,
-            course_outcomes,
-        )
-        return f"dzrsteit2h2vm.cloudfront.net/{key}"
+        if not isinstance(lesson_plan, dict):
+            raise ValueError("lesson_plan is required")
+        use_cache = data.get("use_cache", True)
+        upload_artifacts = data.get("upload_artifacts")
+        job = jobs.submit(run_generation, lesson_plan, use_cache, upload_artifacts)
+        app.logger.info(f"Queued job {job.id}")
+        if wants_stream():
+            return event_stream_response(job)
+        return {"job_id": job.id, "status_url": f"/jobs/{job.id}"}, 202
+    except QueueFull as e:
+        app.logger.warning(f"Rejecting request: {e}")
+        return {"error": str(e)}, 429, {"Retry-After": "30"}
     except ValueError as e:
         app.logger.error(e)
         return {"error": str(e)}, 401
@@ -269,5 +262,23 @@ def generate_question():
         return {"error": str(e)}, 500
 
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Reports progress of a queued generation and its URL once done."""
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown job {job_id}"}, 404
+    return job.to_dict()
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Streams a job's units as server-sent events as soon as each is ready."""
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown job {job_id}"}, 404
+    return event_stream_response(job)
+
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port="5000")
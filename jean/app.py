@@ -1,111 +1,113 @@
+import io
 import os
 import json
 import uuid
 import logging
+import threading
 from logging.handlers import RotatingFileHandler
 
 import dspy
-import streamlit as st
 
-from docx import Document
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-import boto3
+from checkpoint import get_checkpoints, plan_hash
+from coalesce import SingleFlight
+from course import Course
+from fanout import generate_in_order
+from llm import InstrumentedOpenAI, predict, predict_fields, stream_predict
+from metrics import course, span, tagged
+from outline import OutlineParser, parse_objectives, parse_outline
+from prompts import compacted, format_objectives
+from renderers import render
+from reuse import predict_similar
+from revision import Revision, changed_fields, format_outline
+from routing import DEFAULT_MODEL
+from storage import (
+    S3_BUCKET,
+    ArtifactUploader,
+    download_bytes,
+    upload_fileobj,
+    upload_in_background,
+)
 
 log_formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
-file_handler = RotatingFileHandler("app.log", maxBytes=1024 * 1024 * 10, backupCount=10)
-file_handler.setFormatter(log_formatter)
+root_logger = logging.getLogger()
+# Attach the handler once even if the module is executed again.
+if not any(isinstance(h, RotatingFileHandler) for h in root_logger.handlers):
+    file_handler = RotatingFileHandler(
+        "app.log", maxBytes=1024 * 1024 * 10, backupCount=10
+    )
+    file_handler.setFormatter(log_formatter)
+    root_logger.addHandler(file_handler)
+    root_logger.setLevel(logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEBUG_DOCX_PATH = os.getenv("DEBUG_DOCX_PATH")
+
+_lm = None
+_lm_lock = threading.Lock()
+_courses = SingleFlight("course")
 
-if "course_outcomes" not in st.session_state:
-    st.session_state["course_outcomes"] = []
 
-gpt4 = dspy.OpenAI(model="gpt-3.5-turbo", max_tokens=4000, model_type="chat")
-dspy.settings.configure(lm=gpt4)
+def get_lm():
+    """Returns the process-wide OpenAI client, creating it on first use."""
+    global _lm
+    with _lm_lock:
+        if _lm is None:
+            _lm = InstrumentedOpenAI(
+                model=DEFAULT_MODEL, max_tokens=4000, model_type="chat"
+            )
+        return _lm
 
 
 def parse_course_outline(data):
     course_data = json.loads(data)
-    outlines = course_data["outlines"]
-    units = outlines.rstrip("\n").split("\n\n")
-    unit_list = []
-    for i, unit in enumerate(units, start=1):
-        title, description, *objectives = unit.splitlines(keepends=True)
-        title = title.strip()
-        description = description.strip()
-        objectives = [objective.strip() for objective in objectives]
-        unit_dict = {
-            "unit_number": i,
-            "title": title,
-            "description": description,
-            "objectives": objectives,
-        }
-        unit_list.append(unit_dict)
-
-    return unit_list
+    return parse_outline(course_data["outlines"])
 
 
 def update_objectives(objectives):
-    updated_objectives = []
-    for obj in objectives[1:]:
-        objective_number, description = obj.split(". ", 1)
-        description = description.strip()
-        updated_objective = {
-            "objective_number": int(objective_number),
-            "description": description,
-        }
-        updated_objectives.append(updated_objective)
+    return parse_objectives(objectives)
 
-    return updated_objectives
+
+UNIT_SECTIONS = [
+    "disccussion_questions",
+    "learning_activity",
+    "assessment",
+    "essay_questions",
+    "project",
+]
 
 
 def create_course_outline(
     units, output_file, bucket_name, s3_key, heading, description, outcomes
 ):
-    print("uploading to s3")
-    doc = Document()
-    doc.add_heading(f"Course name: {heading}", level=1).paragraph_format.alignment = (
-        WD_PARAGRAPH_ALIGNMENT.CENTER
-    )
-    for paragraph in doc.paragraphs:
-        if f"Course name: {heading}" in paragraph.text:
-            for run in paragraph.runs:
-                run.font.underline = True
-    doc.add_heading("Course Description:", level=2)
-    doc.add_paragraph(description)
-    doc.add_heading("Course Outcomes:", level=2)
-    doc.add_paragraph(outcomes)
-    for index, unit in enumerate(units):
-        doc.add_heading(unit["title"], level=1)
-        if "description" in unit:
-            doc.add_paragraph(unit["description"])
-        if "objectives" in unit:
-            for objective in unit["objectives"]:
-                doc.add_heading(
-                    f"Unit {index+1} Objective {objective['objective_number']}", level=2
-                )
-                doc.add_paragraph(objective["content"])
-                if "terms_nd_definition" in objective:
-                    doc.add_heading("Terms and Definitions", level=3)
-                    doc.add_paragraph(objective["terms_nd_definition"])
-
-        for section in [
-            "disccussion_questions",
-            "learning_activity",
-            "assessment",
-            "essay_questions",
-            "project",
-        ]:
-            if section in unit:
-                doc.add_heading(section.capitalize().replace("_", " "), level=2)
-                doc.add_paragraph(unit[section])
-    doc.save(output_file)
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
-    s3.upload_file(output_file, bucket_name, s3_key)
-
-
+    """Renders the course to DOCX in memory and uploads it to S3.
+
+    The course is uploaded as JSON too, under the same key with a ``.json``
+    extension, so it can be rendered to other formats later without the LM.
+    Only the DOCX upload is waited for; the JSON is sent in the background.
+    ``output_file`` is optional; when set, a copy of the DOCX is also written
+    there so the document can be inspected locally.
+    """
+    logger.info("uploading to s3")
+    generated = Course.from_units(units, heading, description, outcomes)
+    with span("docx_render"):
+        body, content_type, _ = render(generated, "docx")
+    if output_file:
+        with open(output_file, "wb") as f:
+            f.write(body)
+    json_body, json_type, _ = render(generated, "json")
+    json_key = f"{os.path.splitext(s3_key)[0]}.json"
+    upload_in_background(json_body, bucket_name, json_key, json_type)
+    with span("s3_upload"):
+        upload_fileobj(io.BytesIO(body), bucket_name, s3_key, content_type)
+
+
+def output_desc(signature):
+    """Returns the description of a signature's last output field."""
+    *_, field = signature.output_fields.values()
+    return field.json_schema_extra["desc"]
+
+
+@compacted
 class Promot2Outline(dspy.Signature):
     prompt = dspy.InputField()
     course_outline = dspy.OutputField(
@@ -122,6 +124,21 @@ class Promot2Outline(dspy.Signature):
     )
 
 
+@compacted
+class ReviseOutline(dspy.Signature):
+    """Revise a course outline after changes to the course's lesson plan."""
+
+    prompt = dspy.InputField()
+    course_outline = dspy.OutputField(
+        desc="""The complete revised outline, in the same format as the /
+            current one. Copy every unit the changes do not affect exactly /
+            as written, including its title, description and objectives, /
+            and only rewrite, add or remove units where the changes require /
+            it. Number the units from 1 without gaps."""
+    )
+
+
+@compacted
 class UnitIntroduction(dspy.Signature):
     prompt = dspy.InputField()
     unit_description = dspy.OutputField(
@@ -132,6 +149,7 @@ class UnitIntroduction(dspy.Signature):
     )
 
 
+@compacted
 class ObjectiveContent(dspy.Signature):
     objective = dspy.InputField()
     course_content = dspy.OutputField(
@@ -140,6 +158,7 @@ class ObjectiveContent(dspy.Signature):
     )
 
 
+@compacted
 class Discussion4Objective(dspy.Signature):
     objective = dspy.InputField()
     discussion_questions = dspy.OutputField(
@@ -149,6 +168,7 @@ class Discussion4Objective(dspy.Signature):
     )
 
 
+@compacted
 class TermsndDefinitions(dspy.Signature):
     objective = dspy.InputField()
     terms_and_definition = dspy.OutputField(
@@ -156,6 +176,7 @@ class TermsndDefinitions(dspy.Signature):
     )
 
 
+@compacted
 class LearningActivity(dspy.Signature):
     objective = dspy.InputField()
     learning_activity = dspy.OutputField(
@@ -164,6 +185,7 @@ class LearningActivity(dspy.Signature):
     )
 
 
+@compacted
 class ObjectiveQuestions(dspy.Signature):
     objective = dspy.InputField()
     objective_questions_25 = dspy.OutputField(
@@ -173,6 +195,7 @@ class ObjectiveQuestions(dspy.Signature):
     )
 
 
+@compacted
 class EssayQuestions(dspy.Signature):
     objective = dspy.InputField()
     essay_questions_10 = dspy.OutputField(
@@ -182,6 +205,7 @@ class EssayQuestions(dspy.Signature):
     )
 
 
+@compacted
 class ObjectiveProject(dspy.Signature):
     objective = dspy.InputField()
     project = dspy.OutputField(
@@ -192,132 +216,461 @@ class ObjectiveProject(dspy.Signature):
     )
 
 
-def generate_question(lesson_plan):
-    """Generates a outline from the provided context using dspy."""
-    try:
-        data = json.loads(lesson_plan)
-        lesson_plan = data.get("lesson_plan")
-        grade_level = lesson_plan.get("grade_level")
-        subject = lesson_plan.get("subject")
-        course_name = lesson_plan.get("course_name")
-        course_description = lesson_plan.get("course_description")
-        course_outcomes = lesson_plan.get("course_outcomes")
-        number_of_weeks = lesson_plan.get("number_of_weeks")
-        prompt = f"""
-            <complete_response>
-            You are an instructional designer and faculty member for a school /
-            teaching {grade_level} {subject} courses.
-            You are developing a "{grade_level}" level {subject} /
-            course called {course_name}. The course description is /
-            {course_description}.
-            The outcomes of the course include {course_outcomes}
-            Based on this information, you will divide this course into /
-            {number_of_weeks} units. return complete response for the total division.
-        """
-        response = dspy.ChainOfThought(Promot2Outline)(prompt=prompt).course_outline
-        result = parse_course_outline(json.dumps({"outlines": response}))
-        for unit in result:
-            unit_prompt = f"""
-                Unit {unit['unit_number']} will cover the following topics: {unit['description']}
-                The unit {unit['unit_number']} objectives are: {unit['objectives']}
-            """
-            unit["introduction"] = dspy.ChainOfThought(UnitIntroduction)(
-                prompt=unit_prompt
-            ).unit_description
-            unit["objectives"] = update_objectives(unit["objectives"])
-            unit["learning_activity"] = dspy.ChainOfThought(LearningActivity)(
-                objective=f"""As a student, I need a hands-on practice /
-                activity that directly engages me in practicing each of the /
-                specified objectives: {unit['objectives']}"""
-            ).learning_activity
-            unit["disccussion_questions"] = dspy.ChainOfThought(Discussion4Objective)(
-                objective=f"{unit['objectives']}"
-            ).discussion_questions
-            unit["assessment"] = dspy.ChainOfThought(ObjectiveQuestions)(
-                objective=f"{unit['objectives']}"
-            ).objective_questions_25
-            unit["essay_questions"] = dspy.ChainOfThought(EssayQuestions)(
-                objective=f"{unit['objectives']}"
-            ).essay_questions_10
-            unit["project"] = dspy.ChainOfThought(ObjectiveProject)(
-                objective=f"{unit['objectives']}"
-            ).project
-            for objective in unit["objectives"]:
-                objective["content"] = dspy.ChainOfThought(ObjectiveContent)(
-                    objective=f"""Next you will /
-                    create the course content for {unit['unit_number']} /
-                    One of the objectives is to {objective['description']}.""",
-                ).course_content
-                objective["terms_nd_definition"] = dspy.ChainOfThought(
-                    TermsndDefinitions
-                )(objective=objective["description"]).terms_and_definition
-        key = f"{str(uuid.uuid4())}.docx"
+@compacted
+class UnitBundle(dspy.Signature):
+    """Write every section of one course unit from its topics and objectives."""
+
+    prompt = dspy.InputField()
+    introduction = dspy.OutputField(desc=output_desc(UnitIntroduction))
+    learning_activity = dspy.OutputField(
+        desc="""Create 1 hands-on learning activity that directly engages /
+        students in practicing each of the unit objectives"""
+    )
+    discussion_questions = dspy.OutputField(desc=output_desc(Discussion4Objective))
+    assessment = dspy.OutputField(desc=output_desc(ObjectiveQuestions))
+    essay_questions = dspy.OutputField(desc=output_desc(EssayQuestions))
+    project = dspy.OutputField(desc=output_desc(ObjectiveProject))
+
+
+# Unit keys filled by UnitBundle, mapped to its output fields.
+BUNDLE_FIELDS = {
+    "introduction": "introduction",
+    "learning_activity": "learning_activity",
+    "disccussion_questions": "discussion_questions",
+    "assessment": "assessment",
+    "essay_questions": "essay_questions",
+    "project": "project",
+}
+
+GENERATION_MODE = os.getenv("GENERATION_MODE", "sections")
+
+
+def section_task(target, key, signature, output_field, **inputs):
+    """Describes one ``predict`` call whose result is stored as ``target[key]``."""
+    inputs = dict(inputs, signature=signature, output_field=output_field)
+    return target, key, predict, inputs
+
+
+def similar_task(target, key, similar_to, signature, output_field, **inputs):
+    """Like ``section_task`` but may reuse content of a near-identical objective.
+
+    See ``reuse.predict_similar``; ``similar_to`` is the text matched.
+    """
+    inputs = dict(
+        inputs, similar_to=similar_to, signature=signature, output_field=output_field
+    )
+    return target, key, predict_similar, inputs
+
+
+def unit_sections(unit, use_cache=True):
+    """Builds the per-section calls for a unit, keyed by the unit key they fill.
+
+    Expects ``unit["objectives"]`` to be parsed by ``update_objectives``.
+    """
+    objectives = format_objectives(unit["objectives"])
+    return {
+        "learning_activity": section_task(
+            unit,
+            "learning_activity",
+            LearningActivity,
+            "learning_activity",
+            objective=f"""As a student, I need a hands-on practice /
+            activity that directly engages me in practicing each of the /
+            specified objectives:
+            {objectives}""",
+            use_cache=use_cache,
+        ),
+        "disccussion_questions": section_task(
+            unit,
+            "disccussion_questions",
+            Discussion4Objective,
+            "discussion_questions",
+            objective=objectives,
+            use_cache=use_cache,
+        ),
+        "assessment": section_task(
+            unit,
+            "assessment",
+            ObjectiveQuestions,
+            "objective_questions_25",
+            objective=objectives,
+            use_cache=use_cache,
+        ),
+        "essay_questions": section_task(
+            unit,
+            "essay_questions",
+            EssayQuestions,
+            "essay_questions_10",
+            objective=objectives,
+            use_cache=use_cache,
+        ),
+        "project": section_task(
+            unit,
+            "project",
+            ObjectiveProject,
+            "project",
+            objective=objectives,
+            use_cache=use_cache,
+        ),
+    }
+
+
+def generate_bundle(prompt, fallbacks, use_cache=True):
+    """Generates all unit sections with one UnitBundle call.
+
+    Sections that come back empty or unparsed are filled in by running their
+    ``fallbacks`` task, so a partial bundle still yields a complete unit.
+    """
+    sections = predict_fields(
+        UnitBundle, list(BUNDLE_FIELDS.values()), use_cache=use_cache, prompt=prompt
+    )
+    result = {}
+    for key, field in BUNDLE_FIELDS.items():
+        value = (sections.get(field) or "").strip()
+        if not value or value.startswith("${"):
+            logger.warning("Bundle missing %s, running its own call", field)
+            _, _, fn, inputs = fallbacks[key]
+            value = fn(**inputs)
+        result[key] = value
+    return result
+
+
+def unit_tasks(unit, use_cache=True, mode=None, checkpoint=None, revision=None):
+    """Builds the independent LLM calls for a unit and its objectives.
+
+    In ``"bundle"`` mode the unit-level sections come from a single
+    UnitBundle call instead of one call each. With a ``checkpoint`` every
+    call's result is saved as it completes and reused on a retry. With a
+    ``revision`` every call's result is recorded, and calls whose inputs are
+    unchanged since the previous revision reuse its result.
+    """
+    unit["objectives"] = update_objectives(unit["objectives"])
+    objectives = format_objectives(unit["objectives"])
+    unit_prompt = f"""
+        Unit {unit['unit_number']} will cover the following topics: {unit['description']}
+        The unit {unit['unit_number']} objectives are:
+        {objectives}
+    """
+    sections = unit_sections(unit, use_cache)
+    sections["introduction"] = section_task(
+        unit,
+        "introduction",
+        UnitIntroduction,
+        "unit_description",
+        prompt=unit_prompt,
+        use_cache=use_cache,
+    )
+    if (mode or GENERATION_MODE) == "bundle":
+        bundle_prompt = "\n".join(
+            [
+                f"Unit {unit['unit_number']} will cover the following topics: "
+                f"{unit['description']}",
+                "The unit objectives are:",
+                objectives,
+            ]
+        )
+        tasks = [
+            (
+                unit,
+                None,
+                generate_bundle,
+                {
+                    "prompt": bundle_prompt,
+                    "fallbacks": sections,
+                    "use_cache": use_cache,
+                },
+            )
+        ]
+    else:
+        tasks = [sections[key] for key in BUNDLE_FIELDS]
+    for objective in unit["objectives"]:
+        tasks.append(
+            similar_task(
+                objective,
+                "content",
+                objective["description"],
+                ObjectiveContent,
+                "course_content",
+                objective=f"""Next you will /
+                create the course content for {unit['unit_number']} /
+                One of the objectives is to {objective['description']}.""",
+                use_cache=use_cache,
+            )
+        )
+        tasks.append(
+            similar_task(
+                objective,
+                "terms_nd_definition",
+                objective["description"],
+                TermsndDefinitions,
+                "terms_and_definition",
+                objective=objective["description"],
+                use_cache=use_cache,
+            )
+        )
+    if checkpoint is not None:
+        tasks = [
+            (target, key, checkpoint.wrap(fn, section_piece(unit, target, key)), inputs)
+            for target, key, fn, inputs in tasks
+        ]
+    if revision is not None:
+        tasks = [
+            (target, key, revision.wrap(fn, inputs), inputs)
+            for target, key, fn, inputs in tasks
+        ]
+    return [
+        (target, key, tagged(fn, unit=unit["unit_number"]), inputs)
+        for target, key, fn, inputs in tasks
+    ]
+
+
+def section_piece(unit, target, key):
+    """Names the checkpoint of a unit or objective section; the checkpoint
+    adds a hash of the section's inputs (see ``CourseCheckpoint.key``)."""
+    piece = f"unit{unit['unit_number']}"
+    if target is not unit:
+        piece += f".objective{target['objective_number']}"
+    return f"{piece}.{key or 'bundle'}"
+
+
+def generate_units(
+    units,
+    max_concurrency=None,
+    use_cache=True,
+    mode=None,
+    checkpoint=None,
+    revision=None,
+):
+    """Yields each unit, in order, once all of its sections are generated.
+
+    Up to ``max_concurrency`` calls (default ``MAX_CONCURRENCY``) run at once
+    across every unit and objective of the course. ``mode`` is ``"sections"``
+    or ``"bundle"`` and defaults to ``GENERATION_MODE``.
+    """
+    return generate_in_order(
+        (
+            (unit, unit_tasks(unit, use_cache, mode, checkpoint, revision))
+            for unit in units
+        ),
+        max_concurrency,
+    )
+
+
+def stream_outline(prompt, use_cache=True, checkpoint=None, signature=None):
+    """Yields the units of the course outline as soon as each is complete.
+
+    The Promot2Outline completion (or that of ``signature``, e.g.
+    ReviseOutline) is parsed while it streams in, so work on the first units
+    can start before the last ones are written. With a ``checkpoint`` the
+    full outline is saved once it ends and reused on a retry.
+    """
+    signature = signature or Promot2Outline
+    piece = None
+    if checkpoint is not None:
+        piece = checkpoint.key("outline", signature=signature, prompt=prompt)
+    if piece is not None and piece in checkpoint.saved:
+        chunks = [checkpoint.saved[piece]]
+    else:
+        chunks = stream_predict(
+            signature, "course_outline", use_cache=use_cache, prompt=prompt
+        )
+    parser = OutlineParser()
+    text = []
+    for chunk in chunks:
+        text.append(chunk)
+        # Timed per chunk, so the stream's wait for the LM is left out.
+        with span("outline_parse"):
+            units = parser.feed(chunk)
+        yield from units
+    with span("outline_parse"):
+        units = parser.close()
+    yield from units
+    if piece is not None:
+        checkpoint.save(piece, "".join(text))
+
+
+def outline_prompt(lesson_plan):
+    """Asks for the outline of the course described by ``lesson_plan``."""
+    grade_level = lesson_plan.get("grade_level")
+    subject = lesson_plan.get("subject")
+    return f"""
+        <complete_response>
+        You are an instructional designer and faculty member for a school /
+        teaching {grade_level} {subject} courses.
+        You are developing a "{grade_level}" level {subject} /
+        course called {lesson_plan.get('course_name')}. The course description is /
+        {lesson_plan.get('course_description')}.
+        The outcomes of the course include {lesson_plan.get('course_outcomes')}
+        Based on this information, you will divide this course into /
+        {lesson_plan.get('number_of_weeks')} units. return complete response for the total division.
+    """
+
+
+def load_revision(course_id):
+    """Returns the revision saved with a generated course."""
+    return json.loads(download_bytes(S3_BUCKET, f"{course_id}.revision.json"))
+
+
+def revision_prompt(lesson_plan, previous):
+    """Asks for the previous outline to be revised for the edited plan."""
+    old_plan = previous["lesson_plan"]
+    changes = "\n".join(
+        f"- {name} was {old_plan.get(name)!r} and is now {lesson_plan.get(name)!r}"
+        for name in changed_fields(old_plan, lesson_plan)
+    )
+    return f"""
+        You are revising the outline of the "{lesson_plan.get('grade_level')}" /
+        level {lesson_plan.get('subject')} course called /
+        {lesson_plan.get('course_name')}. Its lesson plan changed:
+        {changes}
+        The current outline is:
+        {format_outline(previous["outline"])}
+        Revise it so that it divides the course into /
+        {lesson_plan.get('number_of_weeks')} units. return complete response /
+        for the total division.
+    """
+
+
+def build_course(
+    lesson_plan,
+    on_event,
+    max_concurrency=None,
+    use_cache=True,
+    mode=None,
+    upload_artifacts=None,
+    previous_course_id=None,
+):
+    """Generates the course for ``lesson_plan`` and returns its URL.
+
+    With ``previous_course_id`` the course is regenerated from that earlier
+    course's revision: only what depends on the edited lesson plan fields is
+    generated again (see ``revision``).
+    """
+    course_name = lesson_plan.get("course_name")
+    course_description = lesson_plan.get("course_description")
+    course_outcomes = lesson_plan.get("course_outcomes")
+    prompt = outline_prompt(lesson_plan)
+    course_id = str(uuid.uuid4())
+    checkpoint_id = plan_hash(lesson_plan)
+    previous = None
+    if previous_course_id:
+        previous = load_revision(previous_course_id)
+        checkpoint_id = f"{checkpoint_id}:{previous_course_id}"
+    revision = Revision(lesson_plan, previous)
+    checkpoint = get_checkpoints().course(checkpoint_id, resume=use_cache)
+    # Callers such as the benchmarks may have configured their own LM.
+    lm = dspy.settings.lm or get_lm()
+    artifacts = ArtifactUploader(S3_BUCKET, course_id, upload_artifacts)
+    with course(course_id), dspy.settings.context(lm=lm), artifacts:
+        outline = revision.outline
+
+        def outline_source():
+            if previous is None:
+                return stream_outline(prompt, use_cache, checkpoint)
+            if revision.affects("outline"):
+                return stream_outline(
+                    revision_prompt(lesson_plan, previous),
+                    use_cache,
+                    checkpoint,
+                    ReviseOutline,
+                )
+            return (
+                {**unit, "objectives": list(unit["objectives"])}
+                for unit in previous["outline"]
+            )
+
+        def outline_units():
+            for unit in outline_source():
+                # Snapshot before the unit's tasks start filling it in.
+                outline.append({**unit, "objectives": list(unit["objectives"])})
+                yield unit
+            artifacts.put_json("outline.json", outline)
+            on_event("outline", outline)
+
+        result = []
+        for unit in generate_units(
+            outline_units(), max_concurrency, use_cache, mode, checkpoint, revision
+        ):
+            result.append(unit)
+            artifacts.put_json(f"units/{unit['unit_number']}.json", unit)
+            on_event("unit", unit)
+        key = f"{course_id}.docx"
         create_course_outline(
             result,
-            "course_outline.docx",
-            "dev-vecul-media-assets",
+            DEBUG_DOCX_PATH,
+            S3_BUCKET,
             key,
             course_name,
             course_description,
             course_outcomes,
         )
-        return f"dzrsteit2h2vm.cloudfront.net/{key}"
+        upload_in_background(
+            revision.to_json().encode("utf-8"),
+            S3_BUCKET,
+            f"{course_id}.revision.json",
+            "application/json",
+        )
+    if previous is not None:
+        logger.info("Revised course %s: %s", course_id, revision.stats())
+    checkpoint.clear()
+    return f"dzrsteit2h2vm.cloudfront.net/{key}"
+
+
+def generate_question(
+    lesson_plan,
+    max_concurrency=None,
+    use_cache=True,
+    on_event=None,
+    mode=None,
+    upload_artifacts=None,
+    previous_course_id=None,
+):
+    """Generates a outline from the provided context using dspy.
+
+    Units start generating as soon as the streamed outline contains them.
+    ``on_event(event, payload)`` is called with ``("outline", units)`` once
+    the outline is complete and ``("unit", unit)`` as soon as each unit is
+    complete, so callers can show content before the document is uploaded.
+    With ``upload_artifacts`` (default ``UPLOAD_ARTIFACTS``) the parsed
+    outline and each finished unit are also uploaded as JSON in the
+    background while later units are still generating.
+
+    With ``previous_course_id``, the id of a course generated earlier from an
+    edited version of this lesson plan, only the units, sections and
+    objectives that depend on the edited fields are generated again; the
+    rest is reused from that course.
+
+    A lesson plan identical to one already being generated (same canonical
+    hash, ``use_cache``, ``mode`` and previous course) joins that generation:
+    its events are replayed to ``on_event`` and it returns the same URL.
+    """
+    try:
+        data = json.loads(lesson_plan)
+        lesson_plan = data.get("lesson_plan")
+        return _courses.do(
+            (plan_hash(lesson_plan), use_cache, mode, previous_course_id),
+            lambda publish: build_course(
+                lesson_plan,
+                publish,
+                max_concurrency,
+                use_cache,
+                mode,
+                upload_artifacts,
+                previous_course_id,
+            ),
+            on_event,
+        )
     except ValueError as e:
-        st.write(e)
+        logger.error(e)
         return {"error": str(e)}, 401
     except Exception as e:
-        st.write("Error generating question: %s", e)
+        logger.exception("Error generating question: %s", e)
         return {"error": str(e)}, 500
 
 
-def main():
-    # Text Input fields for lesson plan details
-    grade_level = st.text_input("Grade Level")
-    subject = st.text_input("Subject")
-    course_name = st.text_input("Course Name")
-    course_description = st.text_area("Course Description")
-
-    with st.expander("Course Outcomes"):
-        user_input = st.text_input("Enter course outcome")
-        add_button = st.button("Add", key="add_button")
-        if add_button:
-            if len(user_input) > 0:
-                st.session_state["course_outcomes"] += [user_input]
-                st.write(st.session_state["course_outcomes"])
-
-            else:
-                st.session_state["course_outcomes"] = []
-    course_outcomes = st.session_state["course_outcomes"]
-
-    number_of_weeks = st.number_input("Number of Weeks")
-
-    generate_button = st.button("Generate Course Outline")
-
-    if generate_button:
-        lesson_plan_data = {
-            "lesson_plan": {
-                "grade_level": grade_level,
-                "subject": subject,
-                "course_name": course_name,
-                "course_description": course_description,
-                "course_outcomes": course_outcomes,
-                "number_of_weeks": number_of_weeks,
-            }
-        }
-        lesson_plan_json = json.dumps(lesson_plan_data)
-
-        with st.spinner("Generating Course Outline..."):
-            response = generate_question(lesson_plan_json)
-
-        # Display response (e.g., course outline URL or error message)
-        if isinstance(response, str):
-            message = "Success! "  # Adjust message as needed
-            st.write(message)
-            st.write(f"https://{response}")
-        else:
-            st.error("Error generating question:", response)
-
-
 if __name__ == "__main__":
-    # app.run(debug=True, host="0.0.0.0", port="5000")
+    # Kept so ``streamlit run app.py`` still works; streamlit_app.py defers
+    # importing the pipeline until the first generation.
+    from streamlit_app import main
+
     main()
@@ -0,0 +1,169 @@
+"""Asyncio web service for course generation.
+
+Serves the same ``/`` and ``/generate`` API as the Flask service in
+``app copy.py``, with ``/jobs`` to follow a generation, and makes the same
+LM calls. Each generation runs as a task on the event loop through
+``async_pipeline``, so thousands of LM calls can be in flight without a
+thread each. Run it with an ASGI server::
+
+    hypercorn app_async:app --bind 0.0.0.0:5000
+"""
+import json
+import asyncio
+import logging
+
+import dspy
+from botocore.exceptions import ClientError
+from quart import Quart, Response, request
+from quart_cors import cors
+
+from app import get_lm
+from async_pipeline import abuild_course
+from cache import get_cache
+from course import Course
+from jobs import AsyncJobQueue, QueueFull
+from metrics import exposition
+from renderers import render
+from reuse import reuse_stats
+from storage import S3_BUCKET, download_bytes
+
+app = cors(Quart(__name__))
+logger = logging.getLogger(__name__)
+
+dspy.settings.configure(lm=get_lm())
+
+jobs = AsyncJobQueue()
+
+
+@app.route("/")
+async def home():
+    return "Hello Outline Generator"
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics():
+    body, content_type = exposition()
+    return Response(body, content_type=content_type)
+
+
+@app.route("/cache", methods=["GET"])
+async def cache_stats():
+    return {**get_cache().stats(), "similar_objectives": reuse_stats()}
+
+
+@app.route("/courses/<course_id>.<format>", methods=["GET"])
+async def export_course(course_id, format):
+    """Renders a generated course in another format without calling the LM."""
+    try:
+        text = await asyncio.to_thread(download_bytes, S3_BUCKET, f"{course_id}.json")
+        body, content_type, extension = render(Course.from_json(text), format)
+    except ClientError as e:
+        logger.warning(f"Course {course_id} not found: {e}")
+        return {"error": f"Unknown course {course_id}"}, 404
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    return Response(
+        body,
+        content_type=content_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{course_id}.{extension}"'
+        },
+    )
+
+
+async def run_generation(job, lesson_plan, use_cache=True, upload_artifacts=None):
+    """Builds the course of a job, publishing its progress as job events."""
+
+    def on_event(event, payload):
+        if event == "outline":
+            job.start(len(payload))
+            job.publish("outline", {"units_total": len(payload)})
+        elif event == "unit":
+            job.advance()
+            job.publish("unit", payload)
+
+    return await abuild_course(
+        lesson_plan, on_event, use_cache, upload_artifacts=upload_artifacts
+    )
+
+
+async def stream_job(job):
+    """Renders a job's events as server-sent events, ending with its status."""
+    async for item in job.astream(heartbeat=15):
+        if item is None:
+            yield ": keep-alive\n\n"
+            continue
+        event, data = item
+        yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+
+
+def wants_stream():
+    return (
+        request.args.get("stream") in ("1", "true")
+        or request.accept_mimetypes.best == "text/event-stream"
+    )
+
+
+def event_stream_response(job):
+    response = Response(
+        stream_job(job),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Job-Id": job.id},
+    )
+    # Generations outlast the default response timeout.
+    response.timeout = None
+    return response
+
+
+@app.route("/generate", methods=["POST"])
+async def generate_question():
+    """Queues outline generation for the provided context and returns its job.
+
+    With ``?stream=1`` or ``Accept: text/event-stream`` the response instead
+    streams each unit as a server-sent event once its sections are generated.
+    """
+    try:
+        data = await request.get_json()
+        logger.info(f"Received request {data}")
+        lesson_plan = data.get("lesson_plan")
+        if not isinstance(lesson_plan, dict):
+            raise ValueError("lesson_plan is required")
+        use_cache = data.get("use_cache", True)
+        upload_artifacts = data.get("upload_artifacts")
+        job = jobs.submit(run_generation, lesson_plan, use_cache, upload_artifacts)
+        logger.info(f"Queued job {job.id}")
+        if wants_stream():
+            return event_stream_response(job)
+        return {"job_id": job.id, "status_url": f"/jobs/{job.id}"}, 202
+    except QueueFull as e:
+        logger.warning(f"Rejecting request: {e}")
+        return {"error": str(e)}, 429, {"Retry-After": "30"}
+    except ValueError as e:
+        logger.error(e)
+        return {"error": str(e)}, 401
+    except Exception as e:
+        logger.exception("Error generating question: %s", e)
+        return {"error": str(e)}, 500
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+async def job_status(job_id):
+    """Reports progress of a queued generation and its URL once done."""
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown job {job_id}"}, 404
+    return job.to_dict()
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+async def job_events(job_id):
+    """Streams a job's units as server-sent events as soon as each is ready."""
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown job {job_id}"}, 404
+    return event_stream_response(job)
+
+
+if __name__ == "__main__":
+    app.run(debug=True, host="0.0.0.0", port=5000)
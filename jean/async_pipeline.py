@@ -0,0 +1,148 @@
+"""Asyncio variant of the Flask course generation pipeline in ``app copy.py``.
+
+Courses are built from the same prompts and unit calls (``service``), but
+every LM call is awaited through ``llm.apredict`` and every unit's calls are
+started at once, so a course in flight holds no thread while it waits: the
+shared scheduler alone decides how many requests reach the API. Boto3 and
+sqlite3 have no asyncio interface, so rendering, uploads and checkpoint
+reads and writes run in worker threads.
+
+The LM must be configured process-wide before the first course, e.g.
+``dspy.settings.configure(lm=app.get_lm())``; see ``app_async``.
+"""
+import json
+import uuid
+import asyncio
+import logging
+
+import app
+import service
+from checkpoint import get_checkpoints, plan_hash
+from llm import apredict, predict
+from metrics import course, span, tags
+from outline import parse_outline
+from reuse import apredict_similar, predict_similar
+from storage import S3_BUCKET, ArtifactUploader
+
+logger = logging.getLogger(__name__)
+
+# The awaitable version of each function ``service.unit_tasks`` schedules.
+ASYNC_VARIANTS = {
+    predict: apredict,
+    predict_similar: apredict_similar,
+}
+
+
+async def run_task(unit, target, key, fn, inputs, checkpoint):
+    """Awaits one unit task and stores its result like ``fanout`` does."""
+    piece = checkpoint.key(app.section_piece(unit, target, key), **inputs)
+    if piece in checkpoint.saved:
+        value = checkpoint.saved[piece]
+    else:
+        with tags(unit=unit["unit_number"]):
+            value = await ASYNC_VARIANTS[fn](**inputs)
+        await asyncio.to_thread(checkpoint.save, piece, value)
+    target[key] = value
+
+
+async def agenerate_units(units, on_unit, use_cache=True, checkpoint=None):
+    """Calls ``on_unit(unit)`` for each unit, in order, once it is generated.
+
+    The calls of every unit and objective are started together; how many
+    run at once is left to the LM scheduler.
+    """
+    pending = [
+        (
+            unit,
+            [
+                asyncio.ensure_future(run_task(unit, *task, checkpoint))
+                for task in service.unit_tasks(unit, use_cache)
+            ],
+        )
+        for unit in units
+    ]
+    try:
+        for unit, tasks in pending:
+            await asyncio.gather(*tasks)
+            on_unit(unit)
+    finally:
+        for _, tasks in pending:
+            for task in tasks:
+                task.cancel()
+
+
+async def abuild_course(lesson_plan, on_event, use_cache=True, upload_artifacts=None):
+    """Awaitable ``iter_course`` of ``app copy.py``; returns the course URL."""
+    course_name = lesson_plan.get("course_name")
+    course_description = lesson_plan.get("course_description")
+    course_outcomes = lesson_plan.get("course_outcomes")
+    course_id = str(uuid.uuid4())
+    checkpoint = await asyncio.to_thread(
+        get_checkpoints().course, plan_hash(lesson_plan), use_cache
+    )
+    artifacts = ArtifactUploader(S3_BUCKET, course_id, upload_artifacts)
+    with course(course_id), artifacts:
+        prompt = service.outline_prompt(lesson_plan)
+        piece = checkpoint.key(
+            "outline", service.Promot2Outline, "course_outline", prompt=prompt
+        )
+        if piece in checkpoint.saved:
+            text = checkpoint.saved[piece]
+        else:
+            text = await apredict(
+                service.Promot2Outline,
+                "course_outline",
+                use_cache=use_cache,
+                prompt=prompt,
+            )
+            await asyncio.to_thread(checkpoint.save, piece, text)
+        with span("outline_parse"):
+            units = parse_outline(text)
+        # Snapshot before the units' tasks start filling them in.
+        outline = [{**unit, "objectives": list(unit["objectives"])} for unit in units]
+        artifacts.put_json("outline.json", outline)
+        on_event("outline", outline)
+
+        def on_unit(unit):
+            artifacts.put_json(f"units/{unit['unit_number']}.json", unit)
+            on_event("unit", unit)
+
+        await agenerate_units(units, on_unit, use_cache, checkpoint)
+        key = f"{course_id}.docx"
+        await asyncio.to_thread(
+            app.create_course_outline,
+            units,
+            app.DEBUG_DOCX_PATH,
+            S3_BUCKET,
+            key,
+            course_name,
+            course_description,
+            course_outcomes,
+        )
+    await asyncio.to_thread(checkpoint.clear)
+    return f"dzrsteit2h2vm.cloudfront.net/{key}"
+
+
+async def agenerate_question(
+    lesson_plan, use_cache=True, on_event=None, upload_artifacts=None
+):
+    """Awaitable ``app.generate_question``, with the same events and error
+    results. Revising an earlier course is not supported here.
+
+    Identical courses in flight are not joined here, but their identical LM
+    calls still are (see ``llm.apredict``).
+    """
+    try:
+        data = json.loads(lesson_plan)
+        return await abuild_course(
+            data.get("lesson_plan"),
+            on_event or (lambda event, payload: None),
+            use_cache,
+            upload_artifacts,
+        )
+    except ValueError as e:
+        logger.error(e)
+        return {"error": str(e)}, 401
+    except Exception as e:
+        logger.exception("Error generating question: %s", e)
+        return {"error": str(e)}, 500
@@ -0,0 +1,191 @@
+"""Generates many courses from a JSONL file of lesson plans.
+
+Run from the ``jean`` directory::
+
+    python batch.py plans.jsonl --output results.jsonl --courses 4 --max-in-flight 32
+
+Each line holds a ``{"lesson_plan": {...}}`` payload, the same shape the
+Streamlit form builds (a bare lesson plan object is accepted too). Identical
+plans are generated once. Courses run on a pool of ``--courses`` workers at
+batch priority, so interactive users of the same process go first, and
+every LM call of the batch shares the scheduler's ``--max-in-flight`` cap.
+One result per input line is written to the manifest as soon as it is
+known, and the batch's throughput is printed as JSON at the end.
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import app
+from checkpoint import plan_hash
+from scheduler import BATCH, get_scheduler, priority
+
+logger = logging.getLogger(__name__)
+
+
+def read_plans(path):
+    """Yields ``(line_number, payload)`` for every non-empty line of ``path``.
+
+    Lines that are not valid JSON objects are yielded with an error string
+    in place of the payload.
+    """
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                payload = json.loads(line)
+            except ValueError as e:
+                yield number, f"invalid JSON: {e}"
+                continue
+            if not isinstance(payload, dict):
+                yield number, "expected a JSON object"
+                continue
+            if "lesson_plan" not in payload:
+                payload = {"lesson_plan": payload}
+            if not isinstance(payload["lesson_plan"], dict):
+                yield number, "lesson_plan must be a JSON object"
+                continue
+            yield number, payload
+
+
+def weeks(lesson_plan):
+    try:
+        return int(float(lesson_plan.get("number_of_weeks") or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def generate(payload, max_concurrency=None, use_cache=True, mode=None):
+    """Generates one course at batch priority and returns its manifest fields."""
+    start = time.perf_counter()
+    with priority(BATCH):
+        response = app.generate_question(
+            json.dumps(payload),
+            max_concurrency=max_concurrency,
+            use_cache=use_cache,
+            mode=mode,
+        )
+    result = {"seconds": round(time.perf_counter() - start, 3)}
+    if isinstance(response, str):
+        result.update(status="done", url=f"https://{response}")
+    else:
+        error, _ = response
+        result.update(status="error", error=error["error"])
+    return result
+
+
+def run_batch(
+    plans, manifest, courses=2, max_concurrency=None, use_cache=True, mode=None
+):
+    """Generates every plan and writes one manifest line per input line.
+
+    ``plans`` is an iterable of ``(line_number, payload)`` pairs as yielded
+    by ``read_plans``. Returns the batch summary.
+    """
+    lock = threading.Lock()
+    counts = {"done": 0, "error": 0, "duplicate": 0}
+    units = 0
+
+    def write(entry):
+        with lock:
+            counts[entry["status"]] += 1
+            manifest.write(json.dumps(entry) + "\n")
+            manifest.flush()
+
+    start = time.perf_counter()
+    first_line = {}
+    duplicates = {}
+    with ThreadPoolExecutor(
+        max_workers=max(1, courses), thread_name_prefix="batch"
+    ) as executor:
+        futures = {}
+        payloads = {}
+        for number, payload in plans:
+            if isinstance(payload, str):
+                write({"line": number, "status": "error", "error": payload})
+                continue
+            lesson_plan = payload["lesson_plan"]
+            digest = plan_hash(lesson_plan)
+            if digest in first_line:
+                duplicates.setdefault(digest, []).append(number)
+                continue
+            first_line[digest] = number
+            future = executor.submit(
+                generate, payload, max_concurrency, use_cache, mode
+            )
+            payloads[future] = lesson_plan
+            futures[future] = {
+                "line": number,
+                "plan_hash": digest,
+                "course_name": lesson_plan.get("course_name"),
+            }
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                entry.update(future.result())
+            except Exception as e:
+                logger.exception("Course on line %s failed", entry["line"])
+                entry.update(status="error", error=str(e))
+            if entry["status"] == "done":
+                units += weeks(payloads[future])
+            write(entry)
+            for number in duplicates.get(entry["plan_hash"], []):
+                write(
+                    {
+                        **entry,
+                        "line": number,
+                        "status": "duplicate",
+                        "duplicate_of": entry["line"],
+                    }
+                )
+    elapsed = time.perf_counter() - start
+    generated = len(futures)
+    return {
+        "lines": sum(counts.values()),
+        "unique_courses": len(first_line),
+        **counts,
+        "seconds": round(elapsed, 3),
+        "courses_per_minute": round(generated * 60 / elapsed, 2) if elapsed else None,
+        "units_per_minute": round(units * 60 / elapsed, 2) if elapsed else None,
+        "scheduler": get_scheduler().stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("plans", help="JSONL file of lesson_plan payloads")
+    parser.add_argument("--output", default="results.jsonl", help="manifest path")
+    parser.add_argument(
+        "--courses", type=int, default=2, help="courses generated at once"
+    )
+    parser.add_argument(
+        "--max-in-flight", type=int, help="cap on concurrent LM calls overall"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, help="concurrent calls within one course"
+    )
+    parser.add_argument("--mode", choices=["sections", "bundle"], default=None)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+    if args.max_in_flight:
+        get_scheduler().set_max_limit(args.max_in_flight)
+    with open(args.output, "w") as manifest:
+        summary = run_batch(
+            read_plans(args.plans),
+            manifest,
+            courses=args.courses,
+            max_concurrency=args.concurrency,
+            use_cache=not args.no_cache,
+            mode=args.mode,
+        )
+    logger.info("batch %s: %s", args.plans, json.dumps(summary))
+    json.dump(summary, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
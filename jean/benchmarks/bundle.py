@@ -0,0 +1,90 @@
+"""Compares latency and token use of the per-section and bundled unit paths.
+
+Run from the ``jean`` directory with an OpenAI key configured::
+
+    python -m benchmarks.bundle --repeat 3
+
+or offline against the deterministic fake LM with ``--fake-latency 0.5``.
+Units are taken from ``response.json``. The signature cache and dsp's own
+request cache are both bypassed, so every call of every ``--repeat`` round
+reaches the model. Results are printed as JSON, one entry per mode.
+
+The signature cache and checkpoints are kept in a temporary directory. Older
+versions wrote the fake LM's answers into ``signature_cache.sqlite3`` in the
+working directory; delete that file if it was left by a benchmark run.
+"""
+import os
+import copy
+import json
+import time
+import argparse
+import tempfile
+
+# dsp reads this when it is first imported.
+os.environ["DSP_CACHEBOOL"] = "false"
+# Keep benchmark runs away from the real signature cache and checkpoints.
+_workdir = tempfile.mkdtemp(prefix="jean-bench-")
+os.environ["CACHE_PATH"] = os.path.join(_workdir, "signature_cache.sqlite3")
+os.environ["CHECKPOINT_PATH"] = os.path.join(_workdir, "checkpoints.sqlite3")
+
+import dspy  # noqa: E402
+
+import app  # noqa: E402
+
+
+def token_usage(history):
+    prompt_tokens = completion_tokens = 0
+    for entry in history:
+        usage = entry["response"].get("usage") or {}
+        prompt_tokens += usage.get("prompt_tokens", 0)
+        completion_tokens += usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+def run(mode, units, repeat):
+    lm = dspy.settings.lm
+    first_call = len(lm.history)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        list(app.generate_units(copy.deepcopy(units), use_cache=False, mode=mode))
+    elapsed = time.perf_counter() - start
+    calls = lm.history[first_call:]
+    prompt_tokens, completion_tokens = token_usage(calls)
+    return {
+        "mode": mode,
+        "units": len(units) * repeat,
+        "seconds": round(elapsed, 3),
+        "seconds_per_unit": round(elapsed / (len(units) * repeat), 3),
+        "calls": len(calls),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", default="response.json")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--fake-latency",
+        type=float,
+        help="use the offline FakeLM with this many seconds per call",
+    )
+    args = parser.parse_args()
+    if args.fake_latency is not None:
+        from benchmarks.fakes import FakeLM
+        from benchmarks.pipeline import pipeline_signatures
+
+        dspy.settings.configure(
+            lm=FakeLM(pipeline_signatures(), latency=args.fake_latency)
+        )
+    else:
+        dspy.settings.configure(lm=app.get_lm())
+    with open(args.units) as f:
+        units = json.load(f)
+    results = [run(mode, units, args.repeat) for mode in ("sections", "bundle")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
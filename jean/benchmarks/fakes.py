@@ -0,0 +1,163 @@
+"""Deterministic stand-ins for OpenAI and S3 used by the offline benchmarks."""
+import io
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+
+from dsp.modules.lm import LM
+
+from metrics import record_usage
+
+SAMPLE_UNITS_PATH = os.path.join(os.path.dirname(__file__), "..", "response.json")
+
+# Rough completion sizes, in words, of what gpt-3.5-turbo returns per field.
+FIELD_WORDS = {
+    "course_content": 700,
+    "objective_questions_25": 1100,
+    "assessment": 1100,
+    "essay_questions_10": 350,
+    "essay_questions": 350,
+    "project": 450,
+    "terms_and_definition": 250,
+}
+DEFAULT_WORDS = 200
+
+WEEKS = re.compile(r"into\s*/?\s*(\d+)(?:\.\d+)?\s*units")
+REASONING = "Reasoning: Let's think step by step"
+
+
+def load_sample_units(path=SAMPLE_UNITS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+class FakeLM(LM):
+    """Answers dspy prompts with canned, correctly formatted completions.
+
+    ``signatures`` are the dspy signatures the pipeline uses; their output
+    prefixes tell the fake which fields a prompt asks for. The completion for
+    a prompt depends only on the prompt, so runs are repeatable. Every
+    request sleeps for ``latency`` seconds (plus ``latency_per_token`` per
+    completion token) to mimic the API, and reports a token usage estimate
+    the way the OpenAI client does.
+    """
+
+    def __init__(
+        self, signatures, latency=0.0, latency_per_token=0.0, max_tokens=4000
+    ):
+        super().__init__("fake-gpt-3.5-turbo")
+        self.output_prefixes = {
+            field.json_schema_extra["prefix"]: name
+            for signature in signatures
+            for name, field in signature.output_fields.items()
+        }
+        self.provider = "fake"
+        self.kwargs.update(max_tokens=max_tokens)
+        self.latency = latency
+        self.latency_per_token = latency_per_token
+        self.units = load_sample_units()
+        self._lock = threading.Lock()
+
+    def basic_request(self, prompt, **kwargs):
+        text = self.complete(prompt)
+        usage = self._usage(prompt, text)
+        time.sleep(self.latency + self.latency_per_token * usage["completion_tokens"])
+        return self._record(prompt, text, usage)
+
+    def stream(self, prompt, chunk_chars=64, **kwargs):
+        """Yields the completion in chunks, spreading the latency over them."""
+        text = self.complete(prompt)
+        time.sleep(self.latency)
+        for start in range(0, len(text), chunk_chars):
+            chunk = text[start : start + chunk_chars]
+            time.sleep(self.latency_per_token * len(chunk) / 4)
+            yield chunk
+        self._record(prompt, text, self._usage(prompt, text))
+
+    def _usage(self, prompt, text):
+        return {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(text) // 4,
+        }
+
+    def _record(self, prompt, text, usage):
+        response = {"choices": [{"text": text}], "usage": usage}
+        with self._lock:
+            self.history.append({"prompt": prompt, "response": response})
+        record_usage(usage)
+        return response
+
+    def __call__(self, prompt, only_completed=True, return_sorted=False, **kwargs):
+        return [self.basic_request(prompt, **kwargs)["choices"][0]["text"]]
+
+    def complete(self, prompt):
+        """Builds the rationale and every output field dspy expects next."""
+        # The format guide lists the output fields, in order, right after
+        # the rationale line and before the next "---" separator.
+        start = prompt.find(REASONING)
+        end = prompt.find("\n---", start)
+        guide = prompt[start:end]
+        positions = {}
+        for prefix, name in self.output_prefixes.items():
+            position = guide.find(f"\n{prefix}")
+            if position != -1:
+                positions[position] = (prefix, name)
+        outputs = [positions[position] for position in sorted(positions)]
+        if not outputs:
+            outputs = [("Answer:", "answer")]
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        sections = [f"produce the {outputs[-1][1]}. We work through the request."]
+        for prefix, name in outputs:
+            sections.append(f"{prefix} {self.field_value(name, prompt, seed)}")
+        return "\n\n".join(sections)
+
+    def field_value(self, name, prompt, seed):
+        if name == "course_outline":
+            match = WEEKS.search(prompt)
+            return self.outline(int(match.group(1)) if match else 3)
+        sample = self.units[seed % len(self.units)]
+        words = sample["introduction"].split()
+        count = FIELD_WORDS.get(name, DEFAULT_WORDS)
+        start = seed % len(words)
+        body = [words[(start + i) % len(words)] for i in range(count)]
+        return " ".join(body)
+
+    def outline(self, weeks):
+        units = []
+        for number in range(1, weeks + 1):
+            sample = self.units[(number - 1) % len(self.units)]
+            _, title = sample["title"].split(": ", 1)
+            units.append(
+                "\n".join(
+                    [f"Unit {number}: {title}", sample["description"]]
+                    + sample["objectives"]
+                )
+            )
+        return "\n\n".join(units)
+
+
+class FakeS3:
+    """In-memory subset of the boto3 S3 client used by ``storage``."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def _store(self, bucket, key, body):
+        time.sleep(self.latency)
+        with self._lock:
+            self.objects[(bucket, key)] = body
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        self._store(bucket, key, fileobj.read())
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._store(Bucket, Key, Body)
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
@@ -0,0 +1,309 @@
+"""HTTP load test of the Flask service in ``app copy.py``.
+
+Run from the ``jean`` directory::
+
+    python -m benchmarks.loadtest --concurrency 1 4 16 --duration 60 --weeks 4
+
+The service is started in a subprocess against two local stand-ins (see
+``benchmarks.servers``): a mock OpenAI chat-completions server with
+``--llm-latency`` and ``--llm-error-rate``/``--llm-rate-limit-rate``, and an
+in-memory S3. For each ``--concurrency`` level, ``/generate?stream=1`` is
+driven for ``--duration`` seconds, closed-loop by that many clients or,
+with ``--rate``, by Poisson arrivals at that many courses per second with at
+most that many in flight. Every course has a distinct lesson plan and skips
+the signature cache, so nothing is coalesced or served from cache.
+
+A request succeeds when its event stream ends with ``done``; latency is
+measured from its arrival to that event. The JSON report gives, per level,
+p50/p95/p99 latency, throughput, the error rate by kind and the service's
+peak resident memory and thread count.
+"""
+import os
+import sys
+import json
+import time
+import random
+import runpy
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+APP_SCRIPT = os.path.join(os.path.dirname(__file__), "..", "app copy.py")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q / 100 * len(values)))], 3)
+
+
+def lesson_plan(weeks, number):
+    return {
+        "lesson_plan": {
+            "grade_level": "College",
+            "subject": "Computer Science",
+            "course_name": f"Data Structures {number}",
+            "course_description": "Core data structures and algorithms.",
+            "course_outcomes": ["Analyse algorithms", "Implement data structures"],
+            "number_of_weeks": weeks,
+        },
+        "use_cache": False,
+    }
+
+
+def generate(port, payload, timeout):
+    """Posts one lesson plan and follows its events; returns the outcome."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        connection.request(
+            "POST",
+            "/generate?stream=1",
+            body=json.dumps(payload),
+            headers={"Content-Type": "application/json"},
+        )
+        response = connection.getresponse()
+        if response.status == 429:
+            return "rejected"
+        if response.status != 200:
+            return f"http_{response.status}"
+        while True:
+            line = response.readline()
+            if not line:
+                return "disconnected"
+            if line.startswith(b"event: "):
+                event = line[7:].strip().decode()
+                if event in ("done", "failed"):
+                    return event
+    except (OSError, http.client.HTTPException):
+        return "disconnected"
+    finally:
+        connection.close()
+
+
+def service_usage(pid):
+    """Resident memory (MB) and thread count of a process, from /proc."""
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name == "VmRSS":
+                    usage["rss_mb"] = int(value.split()[0]) / 1024
+                elif name == "Threads":
+                    usage["threads"] = int(value)
+    except OSError:
+        pass
+    return usage
+
+
+class Level:
+    """Outcomes of one concurrency level while it runs."""
+
+    def __init__(self):
+        self.latencies = []
+        self.outcomes = {}
+        self.peak = {}
+        self._lock = threading.Lock()
+
+    def record(self, outcome, latency):
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            if outcome == "done":
+                self.latencies.append(latency)
+
+    def sample(self, usage):
+        with self._lock:
+            for name, value in usage.items():
+                self.peak[name] = max(self.peak.get(name, 0), value)
+
+
+def run_level(port, pid, concurrency, duration, rate, weeks, timeout, counter):
+    level = Level()
+    stop = time.monotonic() + duration
+
+    def one(arrival):
+        number = next(counter)
+        outcome = generate(port, lesson_plan(weeks, number), timeout)
+        level.record(outcome, time.monotonic() - arrival)
+
+    def client():
+        while time.monotonic() < stop:
+            one(time.monotonic())
+
+    def sampler():
+        while not finished.is_set():
+            level.sample(service_usage(pid))
+            finished.wait(0.5)
+
+    finished = threading.Event()
+    sampling = threading.Thread(target=sampler, daemon=True)
+    sampling.start()
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if rate:
+            # Open loop: arrivals keep coming whether or not earlier courses
+            # finished, and queueing time counts towards latency.
+            arrivals = random.Random(concurrency)
+            while time.monotonic() < stop:
+                executor.submit(one, time.monotonic())
+                time.sleep(arrivals.expovariate(rate))
+        else:
+            for _ in range(concurrency):
+                executor.submit(client)
+    elapsed = time.monotonic() - start
+    finished.set()
+    sampling.join()
+    total = sum(level.outcomes.values())
+    done = level.outcomes.get("done", 0)
+    return {
+        "concurrency": concurrency,
+        "arrival_rate": rate,
+        "requests": total,
+        "outcomes": level.outcomes,
+        "error_rate": round(1 - done / total, 4) if total else None,
+        "throughput_per_minute": round(done / elapsed * 60, 2),
+        "latency_p50": percentile(level.latencies, 50),
+        "latency_p95": percentile(level.latencies, 95),
+        "latency_p99": percentile(level.latencies, 99),
+        "seconds": round(elapsed, 1),
+        "peak_rss_mb": round(level.peak.get("rss_mb", 0), 1),
+        "peak_threads": level.peak.get("threads"),
+    }
+
+
+def serve_app(port):
+    """Runs the Flask service on a threaded WSGI server (the subprocess)."""
+    from werkzeug.serving import make_server
+
+    service = runpy.run_path(APP_SCRIPT, run_name="loadtest")
+    make_server("127.0.0.1", port, service["app"], threaded=True).serve_forever()
+
+
+def start_service(port, env):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.loadtest", "--serve-app", str(port)],
+        env=env,
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"service exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.5)
+        finally:
+            connection.close()
+    process.kill()
+    raise RuntimeError("service did not start within 120s")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument(
+        "--rate", type=float, default=None, help="courses per second (open loop)"
+    )
+    parser.add_argument("--weeks", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-latency-per-token", type=float, default=0.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--job-workers", type=int, default=None)
+    parser.add_argument("--serve-app", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    if args.serve_app:
+        serve_app(args.serve_app)
+        return
+
+    from benchmarks.pipeline import pipeline_signatures
+    from benchmarks.servers import MockOpenAI, MockS3
+
+    openai_server = MockOpenAI(
+        pipeline_signatures(),
+        latency=args.llm_latency,
+        latency_per_token=args.llm_latency_per_token,
+        error_rate=args.llm_error_rate,
+        rate_limit_rate=args.llm_rate_limit_rate,
+    ).start()
+    s3_server = MockS3().start()
+    workdir = tempfile.mkdtemp(prefix="jean-loadtest-")
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "mock",
+        "OPENAI_BASE_URL": openai_server.base_url,
+        "S3_ENDPOINT_URL": s3_server.url,
+        "S3_BUCKET": "loadtest",
+        "AWS_ACCESS_KEY_ID": "mock",
+        "AWS_SECRET_ACCESS_KEY": "mock",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "CACHE_PATH": os.path.join(workdir, "signature_cache.sqlite3"),
+        "CHECKPOINT_PATH": os.path.join(workdir, "checkpoints.sqlite3"),
+        "REUSE_OBJECTIVES": "0",
+        "REUSE_INDEX_PATH": os.path.join(workdir, "objective_index"),
+        "DSP_CACHEBOOL": "false",
+        "DSP_CACHEDIR": os.path.join(workdir, "dsp"),
+    }
+    if args.job_workers:
+        env["JOB_WORKERS"] = str(args.job_workers)
+    port = free_port()
+    service = start_service(port, env)
+    counter = iter(range(sys.maxsize))
+    levels = []
+    try:
+        for concurrency in args.concurrency:
+            levels.append(
+                run_level(
+                    port,
+                    service.pid,
+                    concurrency,
+                    args.duration,
+                    args.rate,
+                    args.weeks,
+                    args.timeout,
+                    counter,
+                )
+            )
+            print(json.dumps(levels[-1]), file=sys.stderr)
+    finally:
+        service.terminate()
+        service.wait()
+        openai_server.stop()
+        s3_server.stop()
+    report = {
+        "weeks": args.weeks,
+        "llm": {
+            "latency": args.llm_latency,
+            "error_rate": args.llm_error_rate,
+            "rate_limit_rate": args.llm_rate_limit_rate,
+            **openai_server.stats(),
+        },
+        "s3": s3_server.stats(),
+        "levels": levels,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
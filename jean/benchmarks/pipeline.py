@@ -0,0 +1,238 @@
+"""Offline performance benchmarks for the course generation pipeline.
+
+Run from the ``jean`` directory::
+
+    python -m benchmarks.pipeline --weeks 4 12 52 --latency 0.05 --output bench.json
+
+A deterministic FakeLM replaces OpenAI and an in-memory FakeS3 replaces S3,
+so no credentials or network are needed. ``generate_question`` is timed
+end to end for each course length, and ``parse_course_outline``,
+``update_objectives``, ``create_course_outline`` and re-rendering a stored
+course to each export format are timed in isolation.
+Every result records wall time, throughput, peak traced memory and, where
+the stage is instrumented, the time spent per stage, so the JSON output can
+be compared between versions.
+"""
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+
+# Keep benchmark runs away from the real signature cache, checkpoints and
+# objective index, and off the reuse path, so leftovers of earlier runs
+# cannot skip LM calls and nothing is written into the working tree.
+_workdir = tempfile.mkdtemp(prefix="jean-bench-")
+os.environ["CACHE_PATH"] = os.path.join(_workdir, "signature_cache.sqlite3")
+os.environ["CHECKPOINT_PATH"] = os.path.join(_workdir, "checkpoints.sqlite3")
+os.environ["REUSE_INDEX_PATH"] = os.path.join(_workdir, "objective_index")
+os.environ["REUSE_OBJECTIVES"] = "0"
+
+import dspy  # noqa: E402
+
+import app  # noqa: E402
+import metrics  # noqa: E402
+import storage  # noqa: E402
+from benchmarks.fakes import FakeLM, FakeS3  # noqa: E402
+from course import Course  # noqa: E402
+from renderers import RENDERERS, render  # noqa: E402
+
+
+def pipeline_signatures():
+    return [
+        value
+        for value in vars(app).values()
+        if isinstance(value, type)
+        and issubclass(value, dspy.Signature)
+        and value is not dspy.Signature
+    ]
+
+
+def stage_seconds():
+    """Returns the cumulative seconds recorded per stage so far."""
+    totals = {}
+    for metric in metrics.STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_sum"):
+                name = sample.labels["stage"]
+                if sample.labels["signature"]:
+                    name = f"{name}:{sample.labels['signature']}"
+                totals[name] = sample.value
+    return totals
+
+
+def measure(name, fn, iterations=1, items=1):
+    """Runs ``fn`` ``iterations`` times and reports time, memory and stages."""
+    stages_before = stage_seconds()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        outcome = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stages = {
+        stage: round(seconds - stages_before.get(stage, 0.0), 4)
+        for stage, seconds in stage_seconds().items()
+        if seconds - stages_before.get(stage, 0.0) > 0
+    }
+    result = {
+        "name": name,
+        "iterations": iterations,
+        "seconds": round(elapsed, 4),
+        "seconds_per_iteration": round(elapsed / iterations, 6),
+        "items_per_second": round(items * iterations / elapsed, 2) if elapsed else None,
+        "peak_memory_bytes": peak,
+        "stages": stages,
+    }
+    if isinstance(outcome, tuple):
+        result["error"] = outcome[0]
+    return result
+
+
+def lesson_plan(weeks):
+    return json.dumps(
+        {
+            "lesson_plan": {
+                "grade_level": "College",
+                "subject": "Computer Science",
+                "course_name": "Data Structures and Algorithms",
+                "course_description": "Fundamental data structures and algorithms.",
+                "course_outcomes": [
+                    "Implement common data structures",
+                    "Analyze algorithm complexity",
+                ],
+                "number_of_weeks": float(weeks),
+            }
+        }
+    )
+
+
+def generated_units(lm, weeks):
+    """Builds a fully generated course without timing it."""
+    units = app.parse_course_outline(json.dumps({"outlines": lm.outline(weeks)}))
+    return list(app.generate_units(units, use_cache=False))
+
+
+def run(args):
+    lm = FakeLM(
+        pipeline_signatures(),
+        latency=args.latency,
+        latency_per_token=args.latency_per_token,
+    )
+    dspy.settings.configure(lm=lm)
+    storage.set_s3_client(FakeS3(latency=args.s3_latency))
+    results = []
+    for weeks in args.weeks:
+        calls_before = len(lm.history)
+        result = measure(
+            f"generate_question[{weeks}w]",
+            lambda: app.generate_question(
+                lesson_plan(weeks),
+                max_concurrency=args.concurrency,
+                use_cache=False,
+                mode=args.mode,
+            ),
+            items=weeks,
+        )
+        calls = lm.history[calls_before:]
+        result["lm_calls"] = len(calls)
+        result["prompt_tokens"] = sum(
+            call["response"]["usage"]["prompt_tokens"] for call in calls
+        )
+        result["completion_tokens"] = sum(
+            call["response"]["usage"]["completion_tokens"] for call in calls
+        )
+        results.append(result)
+
+    for weeks in args.weeks:
+        outline = json.dumps({"outlines": lm.outline(weeks)})
+        results.append(
+            measure(
+                f"parse_course_outline[{weeks}w]",
+                lambda: app.parse_course_outline(outline),
+                iterations=args.iterations,
+                items=weeks,
+            )
+        )
+        parsed = app.parse_course_outline(outline)
+        results.append(
+            measure(
+                f"update_objectives[{weeks}w]",
+                lambda: [app.update_objectives(unit["objectives"]) for unit in parsed],
+                iterations=args.iterations,
+                items=weeks,
+            )
+        )
+        units = generated_units(lm, weeks)
+        results.append(
+            measure(
+                f"create_course_outline[{weeks}w]",
+                lambda: app.create_course_outline(
+                    copy.deepcopy(units),
+                    None,
+                    storage.S3_BUCKET,
+                    "benchmark.docx",
+                    "Data Structures and Algorithms",
+                    "Fundamental data structures and algorithms.",
+                    "Implement common data structures",
+                ),
+                items=weeks,
+            )
+        )
+        course_json = Course.from_units(
+            units, "Data Structures and Algorithms", "", []
+        ).to_json()
+        for format in RENDERERS:
+            results.append(
+                measure(
+                    f"render_{format}[{weeks}w]",
+                    # Only the body: ``measure`` takes a tuple for an error.
+                    lambda: render(Course.from_json(course_json), format)[0],
+                    items=weeks,
+                )
+            )
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weeks", type=int, nargs="+", default=[4, 12, 52])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--latency-per-token", type=float, default=0.0)
+    parser.add_argument("--s3-latency", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--mode", choices=["sections", "bundle"], default=None)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "config": vars(args),
+        "results": run(args),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Reports prompt and output token budgets before and after compaction.
+
+Run from the ``jean`` directory::
+
+    python -m benchmarks.prompts --units response.json
+
+For every unit in ``--units`` the inputs of each per-section call are built
+twice: the way the pipeline used to build them (a Python repr of the
+objectives, indented f-strings with "/" continuations) and, through
+``app.unit_tasks``, the way it does now (numbered objective lines,
+compacted). Together with each signature's field descriptions before and
+after ``prompts.compacted`` and its output budget, this gives the token
+counts per signature and for the whole set of units. Tokens are estimated
+as the scheduler does, at four characters each.
+"""
+import copy
+import json
+import argparse
+
+import app
+from outline import parse_objectives
+from prompts import compact, raw_description, token_budget
+from scheduler import estimate_tokens
+
+OLD_MAX_TOKENS = 4000
+
+
+def tokens(text):
+    return estimate_tokens(text, 0)
+
+
+def old_inputs(unit, objectives):
+    """Inputs of each per-section call as the pipeline built them before."""
+    unit_objectives = f"{objectives}"
+    calls = [
+        (
+            app.UnitIntroduction,
+            f"""
+        Unit {unit['unit_number']} will cover the following topics: {unit['description']}
+        The unit {unit['unit_number']} objectives are: {unit['objectives']}
+    """,
+        ),
+        (
+            app.LearningActivity,
+            f"""As a student, I need a hands-on practice /
+            activity that directly engages me in practicing each of the /
+            specified objectives: {objectives}""",
+        ),
+        (app.Discussion4Objective, unit_objectives),
+        (app.ObjectiveQuestions, unit_objectives),
+        (app.EssayQuestions, unit_objectives),
+        (app.ObjectiveProject, unit_objectives),
+    ]
+    for objective in objectives:
+        calls.append(
+            (
+                app.ObjectiveContent,
+                f"""Next you will /
+                create the course content for {unit['unit_number']} /
+                One of the objectives is to {objective['description']}.""",
+            )
+        )
+        calls.append((app.TermsndDefinitions, objective["description"]))
+    return calls
+
+
+def new_inputs(unit):
+    """Inputs of each per-section call as the pipeline builds them now."""
+    tasks = app.unit_tasks(copy.deepcopy(unit), mode="sections")
+    return [
+        (inputs["signature"], compact(inputs.get("prompt") or inputs["objective"]))
+        for _, _, _, inputs in tasks
+    ]
+
+
+def description_tokens(signature, raw):
+    total = 0
+    for name, field in signature.fields.items():
+        if raw:
+            desc = raw_description(signature, name)
+        else:
+            desc = field.json_schema_extra["desc"]
+        total += tokens(desc or "")
+    return total
+
+
+def report(units):
+    rows = {}
+    for unit in units:
+        objectives = parse_objectives(unit["objectives"])
+        for when, calls in (
+            ("before", old_inputs(unit, objectives)),
+            ("after", new_inputs(unit)),
+        ):
+            for signature, text in calls:
+                row = rows.setdefault(
+                    signature.__name__,
+                    {
+                        "calls": 0,
+                        "input_tokens_before": 0,
+                        "input_tokens_after": 0,
+                        "description_tokens_before": description_tokens(
+                            signature, raw=True
+                        ),
+                        "description_tokens_after": description_tokens(
+                            signature, raw=False
+                        ),
+                        "max_tokens_before": OLD_MAX_TOKENS,
+                        "max_tokens_after": token_budget(signature) or OLD_MAX_TOKENS,
+                    },
+                )
+                row[f"input_tokens_{when}"] += tokens(text)
+                if when == "after":
+                    row["calls"] += 1
+    totals = {}
+    for row in rows.values():
+        for when in ("before", "after"):
+            descriptions = row["calls"] * row[f"description_tokens_{when}"]
+            prompt = row[f"input_tokens_{when}"] + descriptions
+            output = row["calls"] * row[f"max_tokens_{when}"]
+            totals[f"prompt_tokens_{when}"] = (
+                totals.get(f"prompt_tokens_{when}", 0) + prompt
+            )
+            totals[f"max_output_tokens_{when}"] = (
+                totals.get(f"max_output_tokens_{when}", 0) + output
+            )
+    return {"units": len(units), "signatures": rows, "totals": totals}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", default="response.json")
+    args = parser.parse_args()
+    with open(args.units) as f:
+        units = json.load(f)
+    print(json.dumps(report(units), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Local HTTP stand-ins for the OpenAI and S3 APIs used by the load test.
+
+``MockOpenAI`` answers ``POST /v1/chat/completions`` with FakeLM's canned,
+correctly formatted completions after a configurable delay, failing a
+configurable share of requests with 429 or 500 so the scheduler's retries
+are exercised. ``MockS3`` keeps objects in memory and implements the
+path-style PutObject, GetObject and HeadObject calls ``storage`` makes.
+Both run on a background thread of the calling process; point the service
+at them with ``OPENAI_BASE_URL`` and ``S3_ENDPOINT_URL``.
+"""
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fakes import FakeLM
+
+OBJECTIVE_LINE = re.compile(r"^\d+\.")
+
+
+class TaggedLM(FakeLM):
+    """FakeLM whose outlines carry a tag derived from the prompt.
+
+    The canned outline only depends on the number of weeks, so every course
+    in a load test would otherwise ask for the same sections and the
+    service would coalesce them. Tagging the descriptions and objectives
+    keeps the downstream prompts of each course distinct.
+    """
+
+    def field_value(self, name, prompt, seed):
+        value = super().field_value(name, prompt, seed)
+        if name != "course_outline":
+            return value
+        tag = f"({seed % 16**6:06x})"
+        lines = []
+        for line in value.splitlines():
+            if line.startswith("Unit ") or line.endswith(":") or not line.strip():
+                lines.append(line)
+            elif OBJECTIVE_LINE.match(line):
+                lines.append(f"{line} {tag}")
+            else:
+                lines.append(f"{tag} {line}")
+        return "\n".join(lines)
+
+
+class _Server:
+    def __init__(self, handler, port=0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stand_in = self
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", ""):
+            body = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if not size:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class _OpenAIHandler(_Handler):
+    def do_POST(self):
+        server = self.server.stand_in
+        request = json.loads(self._body() or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send(404, b'{"error": {"message": "not found"}}')
+        failure = server.failure()
+        if failure:
+            status, kind = failure
+            body = {"error": {"message": f"mock {kind}", "type": kind}}
+            return self._send(status, json.dumps(body).encode("utf-8"))
+        prompt = "\n\n".join(
+            message.get("content") or "" for message in request.get("messages", [])
+        )
+        text = server.lm.complete(prompt)
+        usage = server.lm._usage(prompt, text)
+        time.sleep(
+            server.latency + server.latency_per_token * usage["completion_tokens"]
+        )
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        with server.lock:
+            server.requests += 1
+        response = {
+            "id": "chatcmpl-" + hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:24],
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": usage,
+        }
+        self._send(200, json.dumps(response).encode("utf-8"))
+
+
+class MockOpenAI(_Server):
+    """Chat completions server answering with ``TaggedLM`` completions.
+
+    Each request sleeps ``latency`` seconds plus ``latency_per_token`` per
+    completion token. ``rate_limit_rate`` and ``error_rate`` are the shares
+    of requests answered with a 429 or a 500 instead.
+    """
+
+    def __init__(
+        self,
+        signatures,
+        latency=0.2,
+        latency_per_token=0.0,
+        error_rate=0.0,
+        rate_limit_rate=0.0,
+        port=0,
+        seed=0,
+    ):
+        super().__init__(_OpenAIHandler, port)
+        self.lm = TaggedLM(signatures)
+        self.latency = latency
+        self.latency_per_token = latency_per_token
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    @property
+    def base_url(self):
+        return f"{self.url}/v1"
+
+    def failure(self):
+        """Returns ``(status, kind)`` if this request should fail, else None."""
+        with self.lock:
+            roll = self._random.random()
+            if roll < self.rate_limit_rate:
+                failure = (429, "rate_limit_exceeded")
+            elif roll < self.rate_limit_rate + self.error_rate:
+                failure = (500, "server_error")
+            else:
+                return None
+            self.failures += 1
+            return failure
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "failures": self.failures}
+
+
+def _decode_aws_chunked(body):
+    """Strips the framing of an ``aws-chunked`` upload, keeping the payload."""
+    payload = b""
+    while body:
+        header, _, body = body.partition(b"\r\n")
+        size = int(header.split(b";")[0] or b"0", 16)
+        if not size:
+            return payload
+        payload += body[:size]
+        body = body[size + 2 :]
+    return payload
+
+
+class _S3Handler(_Handler):
+    def _key(self):
+        bucket, _, key = self.path.split("?")[0].lstrip("/").partition("/")
+        return bucket, key
+
+    def do_PUT(self):
+        body = self._body()
+        if "aws-chunked" in self.headers.get("Content-Encoding", ""):
+            body = _decode_aws_chunked(body)
+        server = self.server.stand_in
+        with server.lock:
+            server.objects[self._key()] = (
+                body,
+                self.headers.get("Content-Type", "binary/octet-stream"),
+            )
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        self._send(200, headers={"ETag": etag})
+
+    def do_GET(self):
+        server = self.server.stand_in
+        with server.lock:
+            stored = server.objects.get(self._key())
+        if stored is None:
+            body = (
+                b'<?xml version="1.0" encoding="UTF-8"?><Error><Code>NoSuchKey'
+                b"</Code><Message>The specified key does not exist.</Message></Error>"
+            )
+            return self._send(404, body, "application/xml")
+        body, content_type = stored
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        self._send(200, body, content_type, {"ETag": etag})
+
+    do_HEAD = do_GET
+
+
+class MockS3(_Server):
+    """In-memory S3 reached over HTTP with path-style addressing."""
+
+    def __init__(self, port=0):
+        super().__init__(_S3Handler, port)
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "objects": len(self.objects),
+                "bytes": sum(len(body) for body, _ in self.objects.values()),
+            }
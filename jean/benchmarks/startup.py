@@ -0,0 +1,87 @@
+"""Checks that the Streamlit UI starts and reruns without loading the pipeline.
+
+Run from the ``jean`` directory::
+
+    python -m benchmarks.startup --max-first-run 2.0 --max-rerun 0.15
+
+The UI script is run headless with Streamlit's ``AppTest``: once cold, as a
+new session would, then ``--reruns`` more times as widget interactions do.
+The check fails (exit status 1) if any run is over budget or if a heavy
+module such as dspy or boto3 was imported before the first generation.
+Importing the ``app`` pipeline is timed separately for reference, in a
+fresh interpreter. Results are printed as JSON.
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+# Modules only the generation pipeline needs.
+HEAVY_MODULES = ["dspy", "openai", "boto3", "docx", "prometheus_client"]
+
+IMPORT_APP = (
+    "import time; start = time.perf_counter(); import app; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def time_ui(script, reruns):
+    from streamlit.testing.v1 import AppTest
+
+    test = AppTest.from_file(script, default_timeout=60)
+    start = time.perf_counter()
+    test.run()
+    first_run = time.perf_counter() - start
+    if test.exception:
+        raise RuntimeError(f"{script} raised: {test.exception}")
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    rerun_times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        test.run()
+        rerun_times.append(time.perf_counter() - start)
+    return first_run, rerun_times, loaded
+
+
+def time_app_import():
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_APP], text=True)
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", default="streamlit_app.py")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--max-first-run", type=float, default=2.0)
+    parser.add_argument("--max-rerun", type=float, default=0.15)
+    parser.add_argument(
+        "--skip-app-import", action="store_true", help="don't time importing app"
+    )
+    args = parser.parse_args()
+    first_run, rerun_times, loaded = time_ui(args.script, args.reruns)
+    report = {
+        "first_run_seconds": round(first_run, 4),
+        "rerun_median_seconds": round(statistics.median(rerun_times), 4),
+        "rerun_max_seconds": round(max(rerun_times), 4),
+        "heavy_modules_loaded": loaded,
+    }
+    if not args.skip_app_import:
+        report["app_import_seconds"] = round(time_app_import(), 4)
+    failures = []
+    if first_run > args.max_first_run:
+        failures.append(f"first run took {first_run:.3f}s > {args.max_first_run}s")
+    if report["rerun_median_seconds"] > args.max_rerun:
+        failures.append(
+            f"median rerun took {report['rerun_median_seconds']}s > {args.max_rerun}s"
+        )
+    if loaded:
+        failures.append(f"UI imported {', '.join(loaded)} before generating")
+    report["failures"] = failures
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
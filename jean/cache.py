@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+CACHE_PATH = os.getenv("CACHE_PATH", "signature_cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "20000"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "0")) or None
+
+
+def signature_key(signature, output_field, lm, inputs, config=None):
+    """Content address of a signature call.
+
+    Covers the signature's name, instructions and field descriptions, the LM
+    (its class, provider and model), the settings that shape the completion
+    and the exact input text, so a change to any of them misses the cache and
+    a stand-in LM's answers are never served for a real one. The defining
+    module is left out: the Streamlit app and the Flask service declare their
+    own signature classes, and identical prompts should share entries.
+    ``config`` holds the settings the call is made with (see
+    ``routing.call_config``), which override the LM's.
+    """
+    lm_kwargs = {**getattr(lm, "kwargs", {}), **(config or {})}
+    payload = {
+        "signature": signature.__name__,
+        "instructions": signature.instructions,
+        "fields": {
+            name: field.json_schema_extra for name, field in signature.fields.items()
+        },
+        "output_field": output_field,
+        "lm": type(lm).__name__,
+        "provider": getattr(lm, "provider", None),
+        "model": lm_kwargs.get("model"),
+        "max_tokens": lm_kwargs.get("max_tokens"),
+        "temperature": lm_kwargs.get("temperature"),
+        "inputs": inputs,
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SignatureCache:
+    """Disk-backed LRU cache of signature outputs.
+
+    Entries live in a SQLite database in WAL mode, so the Streamlit app and
+    the Flask service can point at the same file. Once ``max_entries`` is
+    exceeded the least recently read entries are evicted, and entries older
+    than ``ttl`` seconds (if set) are treated as misses.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """Returns the cached value for ``key`` or None on a miss."""
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute(
+                    "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+        self._count(row is not None)
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            conn.execute(
+                """DELETE FROM entries WHERE key IN (
+                    SELECT key FROM entries ORDER BY accessed_at DESC
+                    LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM entries")
+
+    def stats(self):
+        with self._connection() as conn:
+            (size,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+            "max_entries": self.max_entries,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the process-wide cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SignatureCache(ttl=CACHE_TTL_SECONDS)
+        return _cache
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from revision import section_hash
+
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "checkpoints.sqlite3")
+CHECKPOINT_TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_SECONDS", "86400"))
+
+logger = logging.getLogger(__name__)
+
+
+def plan_hash(lesson_plan):
+    """Canonical hash of a lesson plan, used to recognise retries of a course."""
+    encoded = json.dumps(lesson_plan, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """SQLite store of partially generated courses.
+
+    Each completed piece of a course (the outline, a unit section, an
+    objective's content) is saved under the course id as soon as it is
+    generated. Courses untouched for ``ttl`` seconds are removed whenever
+    the store is opened or a course is started.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH, ttl=CHECKPOINT_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS checkpoints (
+                    course_id TEXT NOT NULL,
+                    piece TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (course_id, piece)
+                )"""
+            )
+        self.expire()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def expire(self):
+        """Drops every course whose latest checkpoint is older than the TTL."""
+        cutoff = time.time() - self.ttl
+        with self._connection() as conn:
+            removed = conn.execute(
+                """DELETE FROM checkpoints WHERE course_id IN (
+                    SELECT course_id FROM checkpoints
+                    GROUP BY course_id HAVING MAX(updated_at) < ?
+                )""",
+                (cutoff,),
+            ).rowcount
+        if removed:
+            logger.info("Removed %s expired checkpoints", removed)
+
+    def course(self, course_id, resume=True):
+        """Returns the checkpoints of ``course_id``. With ``resume=False``
+        pieces saved by an earlier attempt are not read back, only replaced,
+        as for a run that bypasses the caches."""
+        self.expire()
+        return CourseCheckpoint(self, course_id, resume)
+
+    def load(self, course_id):
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT piece, value FROM checkpoints WHERE course_id = ?",
+                (course_id,),
+            ).fetchall()
+        return {piece: json.loads(value) for piece, value in rows}
+
+    def save(self, course_id, piece, value):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?)",
+                (course_id, piece, json.dumps(value), time.time()),
+            )
+
+    def clear(self, course_id):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM checkpoints WHERE course_id = ?", (course_id,))
+
+
+class CourseCheckpoint:
+    """Checkpoints of one course; pieces already saved are not regenerated.
+
+    A piece is saved under its name and a hash of the inputs it was computed
+    from (see ``key``), so a retry only reuses it for the same call: a piece
+    of a unit whose outline was regenerated differently, or one written with
+    another app's prompts, is generated again.
+    """
+
+    def __init__(self, store, course_id, resume=True):
+        self.store = store
+        self.course_id = course_id
+        self.saved = store.load(course_id) if resume else {}
+        if self.saved:
+            logger.info(
+                "Resuming course %s from %s checkpoints", course_id, len(self.saved)
+            )
+
+    def key(self, piece, *args, **kwargs):
+        """Names ``piece`` as computed from these call arguments."""
+        inputs = {f"arg{i}": value for i, value in enumerate(args)}
+        return f"{piece}.{section_hash({**inputs, **kwargs})[:16]}"
+
+    def save(self, key, value):
+        self.store.save(self.course_id, key, value)
+        self.saved[key] = value
+
+    def call(self, piece, fn, *args, **kwargs):
+        """Returns the saved result for ``piece`` computed from these
+        arguments, or computes and saves it."""
+        key = self.key(piece, *args, **kwargs)
+        if key in self.saved:
+            return self.saved[key]
+        value = fn(*args, **kwargs)
+        self.save(key, value)
+        return value
+
+    def wrap(self, fn, piece):
+        """Wraps ``fn`` so that its result is checkpointed as ``piece``."""
+
+        def checkpointed(**kwargs):
+            return self.call(piece, fn, **kwargs)
+
+        return checkpointed
+
+    def clear(self):
+        """Drops the course's checkpoints once it has been fully generated."""
+        self.store.clear(self.course_id)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoints():
+    """Returns the process-wide checkpoint store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore()
+        return _store
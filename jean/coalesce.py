@@ -0,0 +1,159 @@
+import asyncio
+import threading
+
+from metrics import COALESCED_CALLS
+
+
+class Flight:
+    """One call in progress, shared by every caller that asked for it."""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.result = None
+        self.error = None
+        self._changed = threading.Condition()
+
+    def publish(self, item):
+        with self._changed:
+            self.items.append(item)
+            self._changed.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self._changed:
+            self.result = result
+            self.error = error
+            self.done = True
+            self._changed.notify_all()
+
+    def follow(self):
+        """Yields every published item, from the first one, until the call
+        finishes; then raises its error if it failed."""
+        index = 0
+        while True:
+            with self._changed:
+                while index == len(self.items) and not self.done:
+                    self._changed.wait()
+                items = self.items[index:]
+                index += len(items)
+                done = self.done
+            yield from items
+            if done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls into one.
+
+    The first caller for a key runs the call; callers asking for the same
+    key while it is running wait for it instead and get its result, or its
+    error. Once the call finishes the key is forgotten, so later callers
+    start a new one (and usually hit the caches it filled).
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                COALESCED_CALLS.labels(self.kind).inc()
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def _forget(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _shared_error(self, error):
+        # Followers re-raise the leader's error; an interrupted or abandoned
+        # leader (KeyboardInterrupt, GeneratorExit) still has to release them.
+        if isinstance(error, Exception):
+            return error
+        return RuntimeError(f"{self.kind} call was interrupted")
+
+    def do(self, key, fn, on_event=None):
+        """Returns ``fn(publish)``, or the result of the identical call
+        already in flight.
+
+        Events passed to ``publish(event, payload)`` are handed to the
+        ``on_event`` of every caller, in the caller's own thread; callers
+        that join late get the earlier events first.
+        """
+        on_event = on_event or (lambda event, payload: None)
+        flight, leader = self._join(key)
+        if not leader:
+            for event, payload in flight.follow():
+                on_event(event, payload)
+            return flight.result
+
+        def publish(event, payload):
+            flight.publish((event, payload))
+            on_event(event, payload)
+
+        result = error = None
+        try:
+            result = fn(publish)
+            return result
+        except BaseException as e:
+            error = self._shared_error(e)
+            raise
+        finally:
+            flight.finish(result, error)
+            self._forget(key, flight)
+
+    def stream(self, key, fn):
+        """Yields the items of the iterable ``fn()`` as they are produced,
+        sharing them with identical calls like ``do``."""
+        flight, leader = self._join(key)
+        if not leader:
+            yield from flight.follow()
+            return
+        error = None
+        try:
+            for item in fn():
+                flight.publish(item)
+                yield item
+        except BaseException as e:
+            error = self._shared_error(e)
+            raise
+        finally:
+            flight.finish(error=error)
+            self._forget(key, flight)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+class AsyncSingleFlight:
+    """``SingleFlight`` for coroutines on one event loop.
+
+    The first caller's coroutine runs as a task; identical calls await the
+    same task. A caller that is cancelled does not cancel the shared call.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self._tasks = {}
+
+    async def do(self, key, fn):
+        """Returns ``await fn()``, or the result of the identical call
+        already in flight."""
+        task = self._tasks.get(key)
+        if task is not None:
+            COALESCED_CALLS.labels(self.kind).inc()
+        else:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return await asyncio.shield(task)
+
+    def in_flight(self):
+        return len(self._tasks)
@@ -0,0 +1,152 @@
+"""Typed representation of a generated course.
+
+Generation fills in plain unit dicts as results arrive; once a course is
+complete it is converted to these slotted classes, which render to every
+output format (see ``renderers``) and serialise to compact JSON so a course
+can be re-exported later without calling the LM again.
+"""
+import json
+from dataclasses import dataclass
+
+# Unit dict keys the generators use for Unit attributes of another name.
+LEGACY_KEYS = {
+    "disccussion_questions": "discussion_questions",
+    "questions": "discussion_questions",
+}
+
+# Unit-level sections in the order they are rendered.
+SECTIONS = [
+    "discussion_questions",
+    "learning_activity",
+    "assessment",
+    "essay_questions",
+    "project",
+]
+
+
+@dataclass
+class Objective:
+    __slots__ = ("number", "description", "content", "terms")
+    number: int
+    description: str
+    content: str
+    terms: str
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get("number", data.get("objective_number")),
+            data.get("description", ""),
+            data.get("content", ""),
+            data.get("terms", data.get("terms_nd_definition", "")),
+        )
+
+    def to_dict(self):
+        return {
+            "number": self.number,
+            "description": self.description,
+            "content": self.content,
+            "terms": self.terms,
+        }
+
+
+@dataclass
+class Unit:
+    __slots__ = (
+        "number",
+        "title",
+        "description",
+        "introduction",
+        "objectives",
+        "discussion_questions",
+        "learning_activity",
+        "assessment",
+        "essay_questions",
+        "project",
+    )
+    number: int
+    title: str
+    description: str
+    introduction: str
+    objectives: list
+    discussion_questions: str
+    learning_activity: str
+    assessment: str
+    essay_questions: str
+    project: str
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a Unit from a generator's unit dict or from ``to_dict``."""
+        sections = {name: data.get(name, "") for name in ("introduction", *SECTIONS)}
+        for key, name in LEGACY_KEYS.items():
+            if data.get(key):
+                sections[name] = data[key]
+        return cls(
+            number=data.get("number", data.get("unit_number")),
+            title=data.get("title", ""),
+            description=data.get("description", ""),
+            objectives=[
+                Objective.from_dict(objective)
+                for objective in data.get("objectives", [])
+                if isinstance(objective, dict)
+            ],
+            **sections,
+        )
+
+    def sections(self):
+        """Yields ``(name, text)`` for each unit-level section that has text."""
+        for name in SECTIONS:
+            text = getattr(self, name)
+            if text:
+                yield name, text
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["objectives"] = [objective.to_dict() for objective in self.objectives]
+        return data
+
+
+@dataclass
+class Course:
+    __slots__ = ("name", "description", "outcomes", "units")
+    name: str
+    description: str
+    outcomes: list
+    units: list
+
+    @classmethod
+    def from_units(cls, units, name, description, outcomes):
+        """Builds a Course from the unit dicts produced by generation."""
+        if isinstance(outcomes, str):
+            outcomes = [outcomes]
+        return cls(
+            name or "",
+            description or "",
+            list(outcomes or []),
+            [Unit.from_dict(unit) for unit in units],
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls.from_units(
+            data.get("units", []),
+            data.get("name"),
+            data.get("description"),
+            data.get("outcomes"),
+        )
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "description": self.description,
+            "outcomes": self.outcomes,
+            "units": [unit.to_dict() for unit in self.units],
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"), ensure_ascii=False)
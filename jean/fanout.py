@@ -0,0 +1,58 @@
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import dspy
+
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "8"))
+
+
+def _call_with_lm(lm, fn, kwargs):
+    # dspy keeps its settings per thread, so pool threads would otherwise fall
+    # back to the main thread's config instead of the caller's lm.
+    with dspy.settings.context(lm=lm):
+        return fn(**kwargs)
+
+
+def generate_in_order(groups, max_concurrency=None):
+    """Runs the tasks of every group concurrently and yields each group's item,
+    in input order, once all of its tasks have finished.
+
+    ``groups`` is an iterable of ``(item, tasks)`` pairs where each task is a
+    ``(target, key, fn, kwargs)`` tuple. The result of ``fn(**kwargs)`` is
+    stored as ``target[key]``, or merged into ``target`` when ``key`` is None.
+    """
+    max_concurrency = max_concurrency or MAX_CONCURRENCY
+    lm = dspy.settings.lm
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, int(max_concurrency)), thread_name_prefix="fanout"
+    )
+    pending = []
+    try:
+        for item, tasks in groups:
+            # Each task runs in a copy of the caller's context so context
+            # variables (metrics tags, the current course) follow it.
+            futures = [
+                (
+                    target,
+                    key,
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        _call_with_lm,
+                        lm,
+                        fn,
+                        kwargs,
+                    ),
+                )
+                for target, key, fn, kwargs in tasks
+            ]
+            pending.append((item, futures))
+        for item, futures in pending:
+            for target, key, future in futures:
+                if key is None:
+                    target.update(future.result())
+                else:
+                    target[key] = future.result()
+            yield item
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
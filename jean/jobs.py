@@ -0,0 +1,224 @@
+import os
+import time
+import asyncio
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "16"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+# Courses the asyncio service generates at once; each costs no thread.
+ASYNC_JOB_LIMIT = int(os.getenv("ASYNC_JOB_LIMIT", "256"))
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """State of one background generation, updated by the worker running it."""
+
+    def __init__(self):
+        self.id = str(uuid.uuid4())
+        self.status = "queued"
+        self.units_done = 0
+        self.units_total = None
+        self.result = None
+        self.error = None
+        self.events = []
+        self.created_at = time.time()
+        self.finished_at = None
+        self._changed = threading.Condition()
+
+    def start(self, units_total):
+        self.units_total = units_total
+
+    def advance(self):
+        self.units_done += 1
+
+    def publish(self, event, data):
+        """Records an event for anyone following the job through ``stream``."""
+        with self._changed:
+            self.events.append((event, data))
+            self._changed.notify_all()
+
+    def finish(self, status):
+        with self._changed:
+            self.status = status
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def stream(self, heartbeat=None):
+        """Yields ``(event, data)`` pairs as they are published until the job
+        finishes, starting from the first one.
+
+        With ``heartbeat`` set, None is yielded whenever that many seconds
+        pass without an event so callers can keep idle connections alive.
+        """
+        index = 0
+        while True:
+            with self._changed:
+                if index == len(self.events) and self.finished_at is None:
+                    self._changed.wait(heartbeat)
+                new_events = self.events[index:]
+                index += len(new_events)
+                finished = self.finished_at is not None
+            if not new_events and not finished and heartbeat is not None:
+                yield None
+            yield from new_events
+            if finished:
+                return
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "units_done": self.units_done,
+            "units_total": self.units_total,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """Runs jobs on a fixed pool of worker threads.
+
+    At most ``workers + max_queued`` jobs are accepted at once; ``submit``
+    raises QueueFull beyond that so callers can shed load instead of piling
+    up work.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_QUEUE_DEPTH):
+        self.workers = workers
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="job"
+        )
+        self._slots = threading.BoundedSemaphore(workers + max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queues ``fn(job, *args, **kwargs)``; its return value is the result."""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(
+                f"{self.workers + self.max_queued} generations already in flight"
+            )
+        job = Job()
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        status = "failed"
+        try:
+            job.result = fn(job, *args, **kwargs)
+            status = "done"
+        except Exception as e:
+            logger.exception("Job %s failed: %s", job.id, e)
+            job.error = str(e)
+        finally:
+            job.finish(status)
+            self._slots.release()
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+
+class AsyncJob(Job):
+    """Job run as an asyncio task, followed without blocking the event loop."""
+
+    def __init__(self):
+        super().__init__()
+        self._updated = asyncio.Event()
+
+    def publish(self, event, data):
+        super().publish(event, data)
+        self._updated.set()
+
+    def finish(self, status):
+        super().finish(status)
+        self._updated.set()
+
+    async def astream(self, heartbeat=None):
+        """Like ``stream`` but awaits new events on the event loop."""
+        index = 0
+        while True:
+            if index == len(self.events) and self.finished_at is None:
+                self._updated.clear()
+                try:
+                    await asyncio.wait_for(self._updated.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    pass
+            new_events = self.events[index:]
+            index += len(new_events)
+            finished = self.finished_at is not None
+            if not new_events and not finished and heartbeat is not None:
+                yield None
+            for event in new_events:
+                yield event
+            if finished:
+                return
+
+
+class AsyncJobQueue(JobQueue):
+    """Runs jobs as tasks on the running event loop.
+
+    Up to ``limit`` jobs run at once and ``max_queued`` more wait for a
+    slot; ``submit`` raises QueueFull beyond that, like ``JobQueue``.
+    """
+
+    def __init__(self, limit=ASYNC_JOB_LIMIT, max_queued=JOB_QUEUE_DEPTH):
+        self.workers = limit
+        self.max_queued = max_queued
+        self._running = None
+        self._accepted = 0
+        self._jobs = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queues ``await fn(job, *args, **kwargs)``; its value is the result."""
+        if self._accepted >= self.workers + self.max_queued:
+            raise QueueFull(
+                f"{self.workers + self.max_queued} generations already in flight"
+            )
+        if self._running is None:
+            self._running = asyncio.Semaphore(self.workers)
+        self._accepted += 1
+        job = AsyncJob()
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        task = asyncio.ensure_future(self._run(job, fn, args, kwargs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job, fn, args, kwargs):
+        status = "failed"
+        try:
+            async with self._running:
+                job.status = "running"
+                job.result = await fn(job, *args, **kwargs)
+                status = "done"
+        except Exception as e:
+            logger.exception("Job %s failed: %s", job.id, e)
+            job.error = str(e)
+        finally:
+            job.finish(status)
+            self._accepted -= 1
@@ -0,0 +1,356 @@
+import asyncio
+import threading
+
+import dsp
+import dspy
+import openai
+from dspy.signatures.signature import signature_to_template
+
+from cache import get_cache, signature_key
+from coalesce import AsyncSingleFlight, SingleFlight
+from metrics import record_cache_lookup, record_usage, span
+from prompts import compact_inputs
+from routing import call_config, get_hedger
+from scheduler import estimate_tokens, get_scheduler
+
+
+# Identical calls running at the same time (e.g. two units sharing an
+# objective, or two requests for the same course) make one LM request.
+_calls = SingleFlight("signature")
+_acalls = AsyncSingleFlight("signature")
+
+_async_client = None
+_async_client_lock = threading.Lock()
+
+
+def get_async_client():
+    """Returns the process-wide AsyncOpenAI client, creating it on first use.
+
+    Its connection pool is shared by every awaited LM call.
+    """
+    global _async_client
+    with _async_client_lock:
+        if _async_client is None:
+            _async_client = openai.AsyncOpenAI()
+        return _async_client
+
+
+def _total_tokens(response):
+    return (response.get("usage") or {}).get("total_tokens", 0)
+
+
+class InstrumentedOpenAI(dspy.OpenAI):
+    """dspy.OpenAI that reports each response's token usage to the open span.
+
+    Requests go through the shared ``LLMScheduler``, which keeps them under
+    the account's rate limits and retries 429s, so dsp's own backoff on
+    ``request`` is bypassed. Calls made with a ``route`` (see
+    ``routing.call_config``) are hedged by the shared ``Hedger`` once the
+    scheduler has admitted them. Calls made with ``fresh=True`` skip dsp's
+    own request cache, which would otherwise answer an identical prompt with
+    its earlier completion.
+    """
+
+    def _messages(self, prompt):
+        messages = [{"role": "user", "content": prompt}]
+        if self.system_prompt:
+            messages.insert(0, {"role": "system", "content": self.system_prompt})
+        return messages
+
+    def request(self, prompt, **kwargs):
+        kwargs.pop("model_type", None)
+        return self.basic_request(prompt, **kwargs)
+
+    def basic_request(self, prompt, **kwargs):
+        name = kwargs.pop("route", None)
+        fresh = kwargs.pop("fresh", False)
+        max_tokens = {**self.kwargs, **kwargs}.get("max_tokens")
+        if fresh:
+            send = self._uncached_request
+        else:
+            send = super(InstrumentedOpenAI, self).basic_request
+        scheduler = get_scheduler()
+        tokens = estimate_tokens(prompt, max_tokens)
+        hedge = None
+        if name is not None:
+            hedge = lambda call: get_hedger().run(name, call, scheduler, tokens)
+        response = scheduler.run(
+            lambda: send(prompt, **kwargs),
+            tokens,
+            used_tokens=_total_tokens,
+            hedge=hedge,
+        )
+        record_usage(response.get("usage"))
+        return response
+
+    def _uncached_request(self, prompt, **kwargs):
+        """``dspy.OpenAI.basic_request`` without dsp's request cache."""
+        raw_kwargs = kwargs
+        kwargs = {**self.kwargs, **kwargs}
+        if self.model_type == "chat":
+            response = openai.chat.completions.create(
+                messages=self._messages(prompt), **kwargs
+            )
+        else:
+            response = openai.completions.create(prompt=prompt, **kwargs)
+        response = response.model_dump()
+        self.history.append(
+            {
+                "prompt": prompt,
+                "response": response,
+                "kwargs": kwargs,
+                "raw_kwargs": raw_kwargs,
+            }
+        )
+        return response
+
+    async def acomplete(self, prompt, **kwargs):
+        """Returns the completion for ``prompt``, awaited on the event loop.
+
+        Admission and retries go through the scheduler's ``arun`` and routed
+        calls are hedged by ``Hedger.arun``, so no thread waits on the API.
+        """
+        name = kwargs.pop("route", None)
+        kwargs.pop("fresh", None)
+        kwargs = {**self.kwargs, **kwargs}
+        messages = self._messages(prompt)
+        scheduler = get_scheduler()
+        tokens = estimate_tokens(prompt, kwargs.get("max_tokens"))
+        hedge = None
+        if name is not None:
+            hedge = lambda call: get_hedger().arun(name, call, scheduler, tokens)
+        response = await scheduler.arun(
+            lambda: get_async_client().chat.completions.create(
+                messages=messages, **kwargs
+            ),
+            tokens,
+            used_tokens=lambda response: _total_tokens(response.model_dump()),
+            hedge=hedge,
+        )
+        record_usage(response.model_dump().get("usage"))
+        return response.choices[0].message.content
+
+    def stream(self, prompt, **kwargs):
+        """Yields the completion for ``prompt`` in chunks as they arrive.
+
+        Streams are routed but not hedged: the first chunk arrives quickly
+        and the caller is already showing text by the time a call is slow.
+        The call counts as in flight until the stream ends.
+        """
+        kwargs.pop("route", None)
+        kwargs = {**self.kwargs, **kwargs, "stream": True}
+        messages = self._messages(prompt)
+        chunks = get_scheduler().stream(
+            lambda: openai.chat.completions.create(messages=messages, **kwargs),
+            estimate_tokens(prompt, kwargs.get("max_tokens")),
+        )
+        text = []
+        for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                text.append(chunk.choices[0].delta.content)
+                yield text[-1]
+        # Streamed responses carry no usage, so estimate it like the scheduler.
+        record_usage(
+            {
+                "prompt_tokens": estimate_tokens(prompt, 0),
+                "completion_tokens": estimate_tokens("".join(text), 0),
+            }
+        )
+
+
+def _request_config(signature, use_cache):
+    """``call_config`` for a call, marked fresh when the caches are bypassed."""
+    config = call_config(signature, dspy.settings.lm)
+    if not use_cache:
+        config["fresh"] = True
+    return config
+
+
+def _cached_call(signature, output_field, use_cache, inputs, compute):
+    cache = get_cache()
+    lm = dspy.settings.lm
+    key = signature_key(signature, output_field, lm, inputs, call_config(signature, lm))
+    if use_cache:
+        value = cache.get(key)
+        record_cache_lookup(signature.__name__, value is not None)
+        if value is not None:
+            return value
+
+    def call(publish):
+        with span("llm", signature.__name__):
+            value = compute()
+        cache.set(key, value)
+        return value
+
+    return _calls.do(("predict", key), call)
+
+
+async def _acached_call(signature, output_field, use_cache, inputs, compute):
+    """``_cached_call`` for a coroutine function ``compute``. The cache is
+    SQLite, so it is read and written in a worker thread."""
+    cache = get_cache()
+    lm = dspy.settings.lm
+    key = signature_key(signature, output_field, lm, inputs, call_config(signature, lm))
+    if use_cache:
+        value = await asyncio.to_thread(cache.get, key)
+        record_cache_lookup(signature.__name__, value is not None)
+        if value is not None:
+            return value
+
+    async def call():
+        with span("llm", signature.__name__):
+            value = await compute()
+        await asyncio.to_thread(cache.set, key, value)
+        return value
+
+    return await _acalls.do(("predict", key), call)
+
+
+async def _acomplete_fields(lm, signature, output_fields, use_cache, inputs):
+    """Sends the ChainOfThought prompt to ``lm.acomplete`` and parses the
+    output fields out of the completion.
+
+    A completion missing one of them is redone through ``predict_fields``,
+    which lets dspy continue the generation, in a worker thread.
+    """
+    template = signature_to_template(dspy.ChainOfThought(signature).extended_signature)
+    example = dsp.Example(demos=[], **inputs)
+    completion = await lm.acomplete(template(example), **call_config(signature, lm))
+    prediction = template.extract(example, completion)
+    fields = {field: prediction.get(field) for field in output_fields}
+    if any(value is None for value in fields.values()):
+        fields = await asyncio.to_thread(
+            predict_fields, signature, output_fields, use_cache, **inputs
+        )
+    return fields
+
+
+def predict(signature, output_field, use_cache=True, **inputs):
+    """Runs a ChainOfThought over ``signature`` and returns one output field.
+
+    Inputs are compacted and the completion is capped at the signature's
+    token budget (see ``prompts``). Results are served from the signature
+    cache when possible. With ``use_cache=False`` the lookup is skipped and
+    the fresh result replaces whatever was cached; dsp's request cache is
+    skipped as well, so the LM is really asked again. A call identical to one
+    already running in another thread waits for that one's result instead
+    of making its own LM request.
+    """
+    inputs = compact_inputs(inputs)
+    config = _request_config(signature, use_cache)
+    return _cached_call(
+        signature,
+        output_field,
+        use_cache,
+        inputs,
+        lambda: getattr(
+            dspy.ChainOfThought(signature)(**inputs, config=config), output_field
+        ),
+    )
+
+
+def predict_fields(signature, output_fields, use_cache=True, **inputs):
+    """Like ``predict`` but returns a dict of several output fields at once."""
+    inputs = compact_inputs(inputs)
+
+    def compute():
+        config = _request_config(signature, use_cache)
+        prediction = dspy.ChainOfThought(signature)(**inputs, config=config)
+        return {field: prediction.get(field) for field in output_fields}
+
+    return _cached_call(signature, list(output_fields), use_cache, inputs, compute)
+
+
+def _stream_completion(lm, signature, output_field, inputs, key):
+    """Streams a ChainOfThought completion and yields the output field's text."""
+    predictor = dspy.ChainOfThought(signature)
+    template = signature_to_template(predictor.extended_signature)
+    prompt = template(dsp.Example(demos=[], **inputs))
+    marker = "\n" + signature.output_fields[output_field].json_schema_extra["prefix"]
+    completion = ""
+    start = None
+    with span("llm", signature.__name__):
+        for chunk in lm.stream(prompt, **call_config(signature, lm)):
+            completion += chunk
+            if start is None:
+                # Everything before the prefix is the rationale.
+                position = completion.find(marker)
+                if position == -1:
+                    continue
+                start = position + len(marker)
+                chunk = completion[start:].lstrip()
+                start = len(completion) - len(chunk)
+            if chunk:
+                yield chunk
+    if start is None:
+        # The LM ignored the format; hand back its raw answer uncached.
+        yield completion.strip()
+        return
+    get_cache().set(key, completion[start:].strip())
+
+
+async def apredict(signature, output_field, use_cache=True, **inputs):
+    """Awaitable ``predict``, for the asyncio pipeline.
+
+    The call holds no thread while it waits for admission or for the API.
+    LMs without ``acomplete``, such as the benchmark fakes, run ``predict``
+    in a worker thread instead.
+    """
+    lm = dspy.settings.lm
+    if not hasattr(lm, "acomplete"):
+        return await asyncio.to_thread(
+            predict, signature, output_field, use_cache, **inputs
+        )
+    inputs = compact_inputs(inputs)
+
+    async def compute():
+        fields = await _acomplete_fields(
+            lm, signature, [output_field], use_cache, inputs
+        )
+        return fields[output_field]
+
+    return await _acached_call(signature, output_field, use_cache, inputs, compute)
+
+
+async def apredict_fields(signature, output_fields, use_cache=True, **inputs):
+    """Awaitable ``predict_fields``; see ``apredict``."""
+    lm = dspy.settings.lm
+    if not hasattr(lm, "acomplete"):
+        return await asyncio.to_thread(
+            predict_fields, signature, output_fields, use_cache, **inputs
+        )
+    inputs = compact_inputs(inputs)
+    return await _acached_call(
+        signature,
+        list(output_fields),
+        use_cache,
+        inputs,
+        lambda: _acomplete_fields(lm, signature, output_fields, use_cache, inputs),
+    )
+
+
+def stream_predict(signature, output_field, use_cache=True, **inputs):
+    """Like ``predict`` but yields the output field's text as it is generated.
+
+    The ChainOfThought prompt is sent to the LM's ``stream`` method and the
+    text after the field's prefix is yielded chunk by chunk. Cached results,
+    and LMs that cannot stream, produce the whole value as a single chunk.
+    The complete value is cached once the stream ends.
+    """
+    lm = dspy.settings.lm
+    if not hasattr(lm, "stream"):
+        yield predict(signature, output_field, use_cache, **inputs)
+        return
+    inputs = compact_inputs(inputs)
+    cache = get_cache()
+    key = signature_key(signature, output_field, lm, inputs, call_config(signature, lm))
+    if use_cache:
+        value = cache.get(key)
+        record_cache_lookup(signature.__name__, value is not None)
+        if value is not None:
+            yield value
+            return
+    yield from _calls.stream(
+        ("stream", key),
+        lambda: _stream_completion(lm, signature, output_field, inputs, key),
+    )
@@ -0,0 +1,183 @@
+import json
+import time
+import logging
+import functools
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = Histogram(
+    "jean_stage_seconds",
+    "Time spent in each pipeline stage.",
+    ["stage", "signature"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160, 320, 640),
+)
+STAGE_ERRORS = Counter(
+    "jean_stage_errors_total", "Pipeline stages that raised.", ["stage", "signature"]
+)
+LLM_TOKENS = Counter(
+    "jean_llm_tokens_total",
+    "Tokens used by LM calls.",
+    ["signature", "kind"],
+)
+CACHE_LOOKUPS = Counter(
+    "jean_cache_lookups_total", "Signature cache lookups.", ["signature", "result"]
+)
+REUSE_LOOKUPS = Counter(
+    "jean_reuse_lookups_total",
+    "Similar-objective index lookups.",
+    ["signature", "result"],
+)
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "jean_llm_concurrency_limit", "Current adaptive limit on in-flight LM calls."
+)
+LLM_IN_FLIGHT = Gauge("jean_llm_in_flight", "LM calls currently in flight.")
+LLM_RETRIES = Counter("jean_llm_retries_total", "Retried LM calls.", ["reason"])
+LLM_HEDGES = Counter(
+    "jean_llm_hedges_total",
+    "Duplicate requests for slow LM calls: sent, won, capped by the spend limit "
+    "or skipped while calls were queued.",
+    ["signature", "result"],
+)
+COALESCED_CALLS = Counter(
+    "jean_coalesced_calls_total",
+    "Calls that joined an identical call already in flight.",
+    ["kind"],
+)
+COURSE_SECONDS = Histogram(
+    "jean_course_seconds",
+    "End-to-end time to generate a course.",
+    buckets=(10, 30, 60, 120, 300, 600, 900, 1200, 1800, 3600),
+)
+
+_tags = contextvars.ContextVar("metrics_tags", default={})
+_span = contextvars.ContextVar("metrics_span", default=None)
+_course = contextvars.ContextVar("metrics_course", default=None)
+
+
+@contextmanager
+def tags(**values):
+    """Adds tags (e.g. ``unit=3``) to every span opened inside the block."""
+    token = _tags.set({**_tags.get(), **values})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def tagged(fn, **values):
+    """Wraps ``fn`` so it runs inside ``tags(**values)``."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with tags(**values):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def span(stage, signature=""):
+    """Times a pipeline stage.
+
+    The duration goes to the ``jean_stage_seconds`` histogram and, inside a
+    ``course`` block, to that course's timing summary together with the
+    current tags. Token usage reported through ``record_usage`` while the
+    span is open is attributed to it.
+    """
+    record = {
+        "stage": stage,
+        "signature": signature,
+        **_tags.get(),
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+    }
+    token = _span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        STAGE_ERRORS.labels(stage, signature).inc()
+        record["error"] = True
+        raise
+    finally:
+        _span.reset(token)
+        record["seconds"] = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage, signature).observe(record["seconds"])
+        if record["prompt_tokens"] or record["completion_tokens"]:
+            LLM_TOKENS.labels(signature, "prompt").inc(record["prompt_tokens"])
+            LLM_TOKENS.labels(signature, "completion").inc(
+                record["completion_tokens"]
+            )
+        summary = _course.get()
+        if summary is not None:
+            summary.append(record)
+
+
+def record_usage(usage):
+    """Adds an LM response's token usage to the innermost open span."""
+    record = _span.get()
+    if record is None or not usage:
+        return
+    record["prompt_tokens"] += usage.get("prompt_tokens", 0)
+    record["completion_tokens"] += usage.get("completion_tokens", 0)
+
+
+def record_cache_lookup(signature, hit):
+    CACHE_LOOKUPS.labels(signature, "hit" if hit else "miss").inc()
+
+
+@contextmanager
+def course(course_id):
+    """Collects every span of one course and logs a timing summary at the end."""
+    records = []
+    token = _course.set(records)
+    tags_token = _tags.set({**_tags.get(), "course_id": course_id})
+    start = time.perf_counter()
+    try:
+        yield records
+    finally:
+        elapsed = time.perf_counter() - start
+        _course.reset(token)
+        _tags.reset(tags_token)
+        COURSE_SECONDS.observe(elapsed)
+        logger.info("course %s timing: %s", course_id, json_summary(records, elapsed))
+
+
+def json_summary(records, elapsed):
+    """Summarises span records per stage and signature as a JSON string."""
+    stages = {}
+    for record in records:
+        name = record["stage"]
+        if record["signature"]:
+            name = f"{name}:{record['signature']}"
+        entry = stages.setdefault(
+            name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "tokens": 0}
+        )
+        entry["count"] += 1
+        entry["seconds"] = round(entry["seconds"] + record["seconds"], 3)
+        entry["max_seconds"] = round(max(entry["max_seconds"], record["seconds"]), 3)
+        entry["tokens"] += record["prompt_tokens"] + record["completion_tokens"]
+    slowest = max(records, key=lambda record: record["seconds"], default=None)
+    return json.dumps(
+        {
+            "seconds": round(elapsed, 3),
+            "stages": stages,
+            "slowest": slowest,
+        },
+        default=str,
+    )
+
+
+def exposition():
+    """Returns the Prometheus text exposition and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,174 @@
+import re
+import logging
+
+# "Unit 3: ...", "**Week 3 - ...**", "## Module 3. ..."
+UNIT_HEADER = re.compile(r"^(?:#+\s*)?(?:\*\*)?\s*(?:unit|week|module)\s*\d+\b", re.I)
+# "1. ...", "2) ...", "(3) ...", "- ...", "* ...", "• ...", "Objective 2: ..."
+OBJECTIVE = re.compile(
+    r"^(?:\d+(?:\.\d+)+[.)]?|\d+[.)]|\(\d+\)|[-*•+]|objective\s*\d*\s*[:.)-])\s+(?=\S)",
+    re.I,
+)
+OBJECTIVES_HEADER = re.compile(r"^(?:learning\s+)?objectives?\s*:?$", re.I)
+# The number of a "3. ..." or "(3) ..." line.
+NUMBER = re.compile(r"^\(?(\d+)[.)]\s")
+
+logger = logging.getLogger(__name__)
+
+
+def _clean(line):
+    """Strips markdown heading and emphasis markers around a line."""
+    return line.replace("**", "").strip().lstrip("#").strip()
+
+
+def is_objective(line):
+    return bool(OBJECTIVE.match(line.strip()))
+
+
+def is_objectives_header(line):
+    return bool(OBJECTIVES_HEADER.match(_clean(line)))
+
+
+def _number(line):
+    match = NUMBER.match(_clean(line))
+    return int(match.group(1)) if match else None
+
+
+def _split(lines):
+    """Splits the lines after a unit's title into description and objectives.
+
+    Objectives follow the "Objectives:" header when there is one, so a
+    bulleted list in the description stays in the description; otherwise
+    they start at the first numbered or bulleted line.
+    """
+    start = next(
+        (i for i, line in enumerate(lines) if is_objectives_header(line)), None
+    )
+    if start is None:
+        start = next(
+            (i for i, line in enumerate(lines) if is_objective(line)), len(lines)
+        )
+    return lines[:start], lines[start:]
+
+
+class OutlineParser:
+    """Incremental parser for Promot2Outline completions.
+
+    Text is fed in arbitrary chunks as the completion streams in and every
+    unit is returned as soon as the next one starts. Units are dicts with
+    ``unit_number``, ``title``, ``description`` and the raw ``objectives``
+    lines that ``parse_objectives`` understands.
+
+    Units may be headed "Unit N", "Week N" or "Module N" (optionally in
+    markdown); such a unit runs, blank lines included, until the next
+    header. Otherwise units are numbered titles or plain paragraphs, and
+    after a blank line a new one starts with a title numbered one past the
+    current one, or with a paragraph once the current unit has objectives.
+    Objectives may be numbered or bulleted and separated by blank lines.
+    Nothing here raises on malformed text; unexpected lines are kept in the
+    description or logged and skipped.
+    """
+
+    def __init__(self):
+        self.units = []
+        self._partial = ""
+        self._lines = []
+        self._headed = False
+        self._blank = False
+
+    def feed(self, text):
+        """Consumes a chunk of the completion and returns the units it closed."""
+        self._partial += text
+        *lines, self._partial = self._partial.split("\n")
+        closed = []
+        for line in lines:
+            unit = self._line(line)
+            if unit is not None:
+                closed.append(unit)
+        return closed
+
+    def close(self):
+        """Ends the completion and returns the units still open."""
+        closed = self.feed("\n")
+        unit = self._emit()
+        if unit is not None:
+            closed.append(unit)
+        return closed
+
+    def _line(self, line):
+        if not line.strip():
+            self._blank = bool(self._lines)
+            return None
+        blank, self._blank = self._blank, False
+        if UNIT_HEADER.match(line.strip()):
+            return self._start(line, headed=True)
+        if blank and not self._headed and self._starts_unit(line):
+            return self._start(line, headed=False)
+        self._lines.append(line)
+        return None
+
+    def _starts_unit(self, line):
+        """Whether ``line``, after a blank line, begins the next unheaded unit."""
+        if is_objectives_header(line):
+            return False
+        _, objectives = _split(self._lines[1:])
+        if not is_objective(line):
+            return any(is_objective(objective) for objective in objectives)
+        number = _number(line)
+        title_number = _number(self._lines[0])
+        if number is None or title_number is None or number != title_number + 1:
+            return False
+        # "2." after objective "1." carries on the objectives.
+        numbers = [_number(objective) for objective in objectives]
+        return not numbers or numbers[-1] != number - 1
+
+    def _start(self, line, headed):
+        unit = self._emit()
+        self._lines = [line]
+        self._headed = headed
+        return unit
+
+    def _emit(self):
+        lines, self._lines = self._lines, []
+        if not lines:
+            return None
+        title, *rest = lines
+        description, objectives = _split(rest)
+        unit = {
+            "unit_number": len(self.units) + 1,
+            "title": _clean(title),
+            "description": "\n".join(_clean(line) for line in description),
+            "objectives": [line.strip() for line in objectives],
+        }
+        self.units.append(unit)
+        return unit
+
+
+def parse_outline(text):
+    """Parses a complete Promot2Outline completion into its units."""
+    parser = OutlineParser()
+    parser.feed(text)
+    parser.close()
+    return parser.units
+
+
+def parse_objectives(lines):
+    """Turns a unit's raw objective lines into numbered objective dicts.
+
+    Headers such as "Objectives:" are skipped and objectives are numbered by
+    position, whatever numbering or bullets the outline used.
+    """
+    objectives = []
+    for line in lines:
+        line = line.strip()
+        match = OBJECTIVE.match(line)
+        if match is None:
+            if line and not is_objectives_header(line):
+                logger.warning("Skipping unrecognised objective line: %s", line)
+            continue
+        objectives.append(
+            {
+                "objective_number": len(objectives) + 1,
+                "description": line[match.end() :].strip(),
+            }
+        )
+    return objectives
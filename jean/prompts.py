@@ -0,0 +1,79 @@
+import os
+import re
+import json
+
+# Output token budgets per signature, rationale included. Signatures not
+# listed keep the LM's own max_tokens.
+DEFAULT_TOKEN_BUDGETS = {
+    "Promot2Outline": 4000,
+    "ReviseOutline": 4000,
+    "UnitBundle": 4000,
+    "ObjectiveQuestions": 3000,
+    "ObjectiveContent": 2000,
+    "EssayQuestions": 1200,
+    "ObjectiveProject": 1200,
+    "TermsndDefinitions": 800,
+    "UnitIntroduction": 700,
+    "LearningActivity": 700,
+    "Discussion4Objective": 400,
+}
+# JSON object of overrides, e.g. TOKEN_BUDGETS='{"ObjectiveContent": 1500}'.
+TOKEN_BUDGETS = {
+    **DEFAULT_TOKEN_BUDGETS,
+    **json.loads(os.getenv("TOKEN_BUDGETS") or "{}"),
+}
+
+# A "/" closing a line was used to continue long prompt lines in the source.
+CONTINUATION = re.compile(r"[ \t]*/[ \t]*\n")
+SPACES = re.compile(r"[ \t]+")
+BLANK_LINES = re.compile(r"\n{3,}")
+
+_raw_descriptions = {}
+
+
+def token_budget(signature):
+    """Returns the max_tokens for ``signature``, or None for the LM default."""
+    return TOKEN_BUDGETS.get(signature.__name__)
+
+
+def compact(text):
+    """Joins "/"-continued lines and drops indentation and runs of spaces,
+    keeping the remaining line breaks. Runs of blank lines shrink to one,
+    which still separates paragraphs such as the units of an outline."""
+    text = CONTINUATION.sub(" ", text)
+    lines = (SPACES.sub(" ", line).strip() for line in text.splitlines())
+    return BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def compact_inputs(inputs):
+    return {
+        name: compact(value) if isinstance(value, str) else value
+        for name, value in inputs.items()
+    }
+
+
+def format_objectives(objectives):
+    """Renders parsed objectives as numbered lines instead of a list repr."""
+    return "\n".join(
+        f"{objective['objective_number']}. {objective['description']}"
+        for objective in objectives
+    )
+
+
+def compacted(signature):
+    """Class decorator that compacts a signature's instructions and field
+    descriptions, which dspy repeats in every prompt."""
+    if signature.__doc__:
+        signature.__doc__ = compact(signature.__doc__)
+    for name, field in signature.fields.items():
+        extra = field.json_schema_extra
+        if isinstance(extra.get("desc"), str):
+            _raw_descriptions[(signature.__name__, name)] = extra["desc"]
+            extra["desc"] = compact(extra["desc"])
+    return signature
+
+
+def raw_description(signature, name):
+    """The description of a field as written, before ``compacted``."""
+    field = signature.fields[name].json_schema_extra
+    return _raw_descriptions.get((signature.__name__, name), field.get("desc"))
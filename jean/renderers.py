@@ -0,0 +1,187 @@
+"""Renders a ``course.Course`` to DOCX, Markdown, HTML or JSON.
+
+Renderers are registered by format name with ``renderer`` and looked up by
+``render``, so a new output format is one decorated function. To re-export a
+generated course without calling the LM, run from the ``jean`` directory::
+
+    python renderers.py course.json --format html --output course.html
+
+or pass ``--course-id`` to read the course JSON uploaded next to its DOCX.
+"""
+import io
+import sys
+import html
+import argparse
+
+from docx import Document
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+
+from course import Course
+from storage import S3_BUCKET, download_bytes
+
+RENDERERS = {}
+
+
+def renderer(name, content_type, extension):
+    """Registers the decorated ``fn(course) -> bytes`` as format ``name``."""
+
+    def register(fn):
+        RENDERERS[name] = (fn, content_type, extension)
+        return fn
+
+    return register
+
+
+def render(course, format):
+    """Returns ``(body, content_type, extension)`` of ``course`` in ``format``."""
+    if format not in RENDERERS:
+        raise ValueError(
+            f"Unknown format {format!r}, expected one of {', '.join(RENDERERS)}"
+        )
+    fn, content_type, extension = RENDERERS[format]
+    return fn(course), content_type, extension
+
+
+def section_title(name):
+    return name.capitalize().replace("_", " ")
+
+
+@renderer(
+    "docx",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "docx",
+)
+def render_docx(course):
+    doc = Document()
+    title = doc.add_heading(f"Course name: {course.name}", level=1)
+    title.paragraph_format.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    for run in title.runs:
+        run.font.underline = True
+    doc.add_heading("Course Description:", level=2)
+    doc.add_paragraph(course.description)
+    doc.add_heading("Course Outcomes:", level=2)
+    doc.add_paragraph("\n".join(course.outcomes))
+    for unit in course.units:
+        doc.add_heading(unit.title, level=1)
+        doc.add_paragraph(unit.description)
+        if unit.introduction:
+            doc.add_paragraph(unit.introduction)
+        for objective in unit.objectives:
+            doc.add_heading(f"Unit {unit.number} Objective {objective.number}", level=2)
+            doc.add_paragraph(objective.content)
+            if objective.terms:
+                doc.add_heading("Terms and Definitions", level=3)
+                doc.add_paragraph(objective.terms)
+        for name, text in unit.sections():
+            doc.add_heading(section_title(name), level=2)
+            doc.add_paragraph(text)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+@renderer("md", "text/markdown; charset=utf-8", "md")
+def render_markdown(course):
+    lines = [
+        f"# {course.name}",
+        "",
+        "## Course Description",
+        "",
+        course.description,
+        "",
+        "## Course Outcomes",
+        "",
+        *(f"- {outcome}" for outcome in course.outcomes),
+    ]
+    for unit in course.units:
+        lines += ["", f"## {unit.title}", "", unit.description]
+        if unit.introduction:
+            lines += ["", unit.introduction]
+        for objective in unit.objectives:
+            lines += [
+                "",
+                f"### Unit {unit.number} Objective {objective.number}",
+                "",
+                f"*{objective.description}*",
+                "",
+                objective.content,
+            ]
+            if objective.terms:
+                lines += ["", "#### Terms and Definitions", "", objective.terms]
+        for name, text in unit.sections():
+            lines += ["", f"### {section_title(name)}", "", text]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _paragraphs(text):
+    return "".join(
+        f"<p>{html.escape(paragraph).replace(chr(10), '<br>')}</p>"
+        for paragraph in text.split("\n\n")
+        if paragraph.strip()
+    )
+
+
+@renderer("html", "text/html; charset=utf-8", "html")
+def render_html(course):
+    name = html.escape(course.name)
+    parts = [
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{name}</title>"
+        f"</head><body><h1>{name}</h1>",
+        "<h2>Course Description</h2>",
+        _paragraphs(course.description),
+        "<h2>Course Outcomes</h2><ul>",
+        *(f"<li>{html.escape(outcome)}</li>" for outcome in course.outcomes),
+        "</ul>",
+    ]
+    for unit in course.units:
+        parts += [
+            f"<section><h2>{html.escape(unit.title)}</h2>",
+            _paragraphs(unit.description),
+            _paragraphs(unit.introduction),
+        ]
+        for objective in unit.objectives:
+            parts += [
+                f"<h3>Unit {unit.number} Objective {objective.number}</h3>",
+                f"<p><em>{html.escape(objective.description)}</em></p>",
+                _paragraphs(objective.content),
+            ]
+            if objective.terms:
+                parts += [
+                    "<h4>Terms and Definitions</h4>",
+                    _paragraphs(objective.terms),
+                ]
+        for name, text in unit.sections():
+            parts += [f"<h3>{section_title(name)}</h3>", _paragraphs(text)]
+        parts.append("</section>")
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+@renderer("json", "application/json", "json")
+def render_json(course):
+    return course.to_json().encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("path", nargs="?", help="course JSON file")
+    source.add_argument("--course-id", help="read <course id>.json from S3")
+    parser.add_argument("--format", choices=sorted(RENDERERS), default="md")
+    parser.add_argument("--output", help="write here instead of stdout")
+    args = parser.parse_args()
+    if args.course_id:
+        text = download_bytes(S3_BUCKET, f"{args.course_id}.json").decode("utf-8")
+    else:
+        with open(args.path) as f:
+            text = f.read()
+    body, _, _ = render(Course.from_json(text), args.format)
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(body)
+    else:
+        sys.stdout.buffer.write(body)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import zlib
+import atexit
+import asyncio
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+from llm import apredict, predict
+from metrics import REUSE_LOOKUPS
+
+REUSE_OBJECTIVES = os.getenv("REUSE_OBJECTIVES", "").lower() in ("1", "true")
+REUSE_INDEX_PATH = os.getenv("REUSE_INDEX_PATH", "objective_index")
+REUSE_THRESHOLD = float(os.getenv("REUSE_THRESHOLD", "0.95"))
+EMBEDDING_DIM = 2048
+
+WORD = re.compile(r"\w+")
+
+logger = logging.getLogger(__name__)
+
+
+def embed(text, dim=EMBEDDING_DIM):
+    """Unit-length hashed bag of words and character trigrams for ``text``.
+
+    Cheap, deterministic and local: near-identical objectives that differ in
+    a word or two, or in punctuation and case, land close together.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    words = WORD.findall(text.lower())
+    for word in words:
+        vector[zlib.crc32(word.encode("utf-8")) % dim] += 1.0
+    joined = " ".join(words)
+    for i in range(len(joined) - 2):
+        vector[zlib.crc32(joined[i : i + 3].encode("utf-8")) % dim] += 0.5
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def key_tokens(text):
+    """Numbers and capitalised words after the first: names, acronyms and
+    roman numerals, which change what an objective is about however alike
+    the rest of it is ("World War I" and "World War II")."""
+    return {word.lower() for word in WORD.findall(text)[1:] if not word.islower()}
+
+
+def _digest(texts):
+    """Hash of ``texts`` in order, saved with the vectors embedded from them."""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+class SimilarityIndex:
+    """On-disk nearest-neighbour index of generated content for one signature.
+
+    Entries are appended to ``<path>.jsonl`` as they are added; their vectors
+    are kept in ``<path>.npz`` with a digest of the texts they were embedded
+    from, so a restart loads the whole matrix in one read and only embeds
+    entries the matrix does not cover yet. A matrix whose texts are not the
+    entries' (another process appended entries in between, or a line cut
+    short by a crash was skipped) is embedded again rather than paired with
+    the wrong content. Lookups are a single matrix-vector product.
+    """
+
+    def __init__(self, path, threshold=REUSE_THRESHOLD, dim=EMBEDDING_DIM):
+        self.path = path
+        self.threshold = threshold
+        self.dim = dim
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.texts, self.values = self._load_entries()
+        self.vectors = self._load_vectors()
+        self._pending = []
+
+    def _load_entries(self):
+        texts, values = [], []
+        if os.path.exists(f"{self.path}.jsonl"):
+            with open(f"{self.path}.jsonl") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash mid-write.
+                        continue
+                    texts.append(entry["text"])
+                    values.append(entry["value"])
+        return texts, values
+
+    def _load_vectors(self):
+        vectors = np.zeros((0, self.dim), dtype=np.float32)
+        if os.path.exists(f"{self.path}.npz"):
+            with np.load(f"{self.path}.npz") as saved:
+                if (
+                    saved["vectors"].shape[1:] == (self.dim,)
+                    and len(saved["vectors"]) <= len(self.texts)
+                    and str(saved["digest"])
+                    == _digest(self.texts[: len(saved["vectors"])])
+                ):
+                    vectors = saved["vectors"]
+        if len(vectors) < len(self.texts):
+            missing = [embed(text, self.dim) for text in self.texts[len(vectors) :]]
+            vectors = np.vstack([vectors, *missing])
+            self._write(vectors)
+        return vectors
+
+    def _write(self, vectors):
+        # Written whole and renamed, so a reader never sees half a matrix.
+        temporary = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(temporary, vectors=vectors, digest=_digest(self.texts))
+        os.replace(temporary, f"{self.path}.npz")
+
+    def _matrix(self):
+        if self._pending:
+            self.vectors = np.vstack([self.vectors, *self._pending])
+            self._pending = []
+        return self.vectors
+
+    def lookup(self, text):
+        """Returns ``(value, score, matched_text)`` of the closest entry that
+        scores at least ``threshold`` and has the same ``key_tokens``, or None.
+        """
+        query = embed(text, self.dim)
+        tokens = key_tokens(text)
+        with self._lock:
+            vectors = self._matrix()
+            if len(vectors):
+                scores = vectors @ query
+                candidates = np.flatnonzero(scores >= self.threshold)
+                for best in candidates[np.argsort(-scores[candidates])]:
+                    if (
+                        self.values[best] is not None
+                        and key_tokens(self.texts[best]) == tokens
+                    ):
+                        self.hits += 1
+                        return self.values[best], float(scores[best]), self.texts[best]
+            self.misses += 1
+        return None
+
+    def add(self, text, value):
+        with self._lock:
+            self.texts.append(text)
+            self.values.append(value)
+            self._pending.append(embed(text, self.dim))
+            with open(f"{self.path}.jsonl", "a") as f:
+                f.write(json.dumps({"text": text, "value": value}) + "\n")
+
+    def save(self):
+        """Writes the vector matrix so the next load skips re-embedding."""
+        with self._lock:
+            self._write(self._matrix())
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "entries": len(self.texts),
+            }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(signature, output_field):
+    """Returns the process-wide index for a signature's output field.
+
+    Indexes are named after the signature and a hash of its field
+    descriptions, so rewording a prompt starts a fresh index.
+    """
+    field = signature.output_fields[output_field].json_schema_extra
+    digest = hashlib.sha256(
+        json.dumps([signature.instructions, field], sort_keys=True).encode("utf-8")
+    ).hexdigest()[:12]
+    name = f"{signature.__name__}.{output_field}.{digest}"
+    with _indexes_lock:
+        if name not in _indexes:
+            os.makedirs(REUSE_INDEX_PATH, exist_ok=True)
+            _indexes[name] = SimilarityIndex(os.path.join(REUSE_INDEX_PATH, name))
+        return _indexes[name]
+
+
+def adapt(value, matched, text):
+    """Points content written for objective ``matched`` at objective ``text``."""
+    if not isinstance(value, str) or matched == text:
+        return value
+    return value.replace(matched, text)
+
+
+def _reuse(index, similar_to, signature):
+    """Returns the adapted content of a near-identical objective, or None."""
+    match = index.lookup(similar_to)
+    REUSE_LOOKUPS.labels(signature.__name__, "hit" if match else "miss").inc()
+    if match is None:
+        return None
+    value, score, matched = match
+    logger.info("Reusing %s of %r (%.3f)", signature.__name__, matched, score)
+    return adapt(value, matched, similar_to)
+
+
+def predict_similar(
+    similar_to, signature, output_field, use_cache=True, enabled=None, **inputs
+):
+    """``predict`` that reuses content generated for a near-identical objective.
+
+    ``similar_to`` is the text compared against the index, typically the
+    objective's description. When reuse is enabled (default
+    ``REUSE_OBJECTIVES``) and an earlier objective scores at least
+    ``REUSE_THRESHOLD`` and names the same things (``key_tokens``), its
+    content is returned with that objective's wording swapped for this one's
+    and no LM call is made. Fresh results are added to the index.
+    ``use_cache=False`` bypasses the index too.
+    """
+    enabled = REUSE_OBJECTIVES if enabled is None else enabled
+    if not enabled:
+        return predict(signature, output_field, use_cache, **inputs)
+    index = get_index(signature, output_field)
+    value = _reuse(index, similar_to, signature) if use_cache else None
+    if value is None:
+        value = predict(signature, output_field, use_cache, **inputs)
+        if value is not None:
+            index.add(similar_to, value)
+    return value
+
+
+async def apredict_similar(
+    similar_to, signature, output_field, use_cache=True, enabled=None, **inputs
+):
+    """Awaitable ``predict_similar``, for the asyncio pipeline. The index is
+    written to disk, so new results are added in a worker thread."""
+    enabled = REUSE_OBJECTIVES if enabled is None else enabled
+    if not enabled:
+        return await apredict(signature, output_field, use_cache, **inputs)
+    index = get_index(signature, output_field)
+    value = _reuse(index, similar_to, signature) if use_cache else None
+    if value is None:
+        value = await apredict(signature, output_field, use_cache, **inputs)
+        if value is not None:
+            await asyncio.to_thread(index.add, similar_to, value)
+    return value
+
+
+def save_indexes():
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.save()
+
+
+atexit.register(save_indexes)
+
+
+def reuse_stats():
+    """Hit-rate statistics of every index opened by this process."""
+    with _indexes_lock:
+        return {name: index.stats() for name, index in _indexes.items()}
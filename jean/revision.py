@@ -0,0 +1,143 @@
+"""Incremental regeneration of a course after its lesson plan is edited.
+
+Every generated course keeps a ``Revision``: its lesson plan, the parsed
+outline and the result of each section call, stored under a hash of that
+call's inputs. Regenerating from an earlier revision works out which parts
+of the course depend on the edited fields (``FIELD_DEPENDENCIES``); an
+unaffected outline is kept as is and an affected one is revised rather than
+rewritten, so unchanged units keep their text. Sections whose inputs hash
+the same as before are then reused instead of calling the LM again.
+"""
+import json
+import hashlib
+import threading
+
+# What each lesson plan field feeds: the outline prompt (and through it every
+# unit and section) or only the header of the rendered document.
+FIELD_DEPENDENCIES = {
+    "grade_level": {"outline"},
+    "subject": {"outline"},
+    "course_description": {"outline", "document"},
+    "course_outcomes": {"outline", "document"},
+    "number_of_weeks": {"outline"},
+    "course_name": {"document"},
+}
+# Task inputs that do not change a section's text.
+IGNORED_INPUTS = {"use_cache", "fallbacks"}
+
+
+def _describe(value):
+    """Stands a signature in for its prompt, so that two signatures of the
+    same name but different instructions or fields hash differently."""
+    fields = getattr(value, "fields", None)
+    if isinstance(value, type) and isinstance(fields, dict):
+        return {
+            "name": value.__name__,
+            "instructions": value.instructions,
+            "fields": {name: field.json_schema_extra for name, field in fields.items()},
+        }
+    return getattr(value, "__name__", value)
+
+
+def section_hash(inputs):
+    """Hash of the inputs of a section call, signatures described by prompt."""
+    payload = {
+        name: _describe(value)
+        for name, value in inputs.items()
+        if name not in IGNORED_INPUTS
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def changed_fields(old_plan, new_plan):
+    """Lesson plan fields whose values differ between two plans."""
+    return sorted(
+        name
+        for name in {**old_plan, **new_plan}
+        if old_plan.get(name) != new_plan.get(name)
+    )
+
+
+def affected(fields):
+    """Parts of the course that depend on any of ``fields``. Unknown fields
+    are assumed to affect the outline."""
+    parts = set()
+    for name in fields:
+        parts |= FIELD_DEPENDENCIES.get(name, {"outline"})
+    return parts
+
+
+def format_outline(units):
+    """Writes parsed outline units back out in the outline's own format."""
+    return "\n\n".join(
+        "\n".join([unit["title"], unit["description"]] + list(unit["objectives"]))
+        for unit in units
+    )
+
+
+class Revision:
+    """Inputs and results of one generation of a course.
+
+    ``previous`` is the ``to_dict`` of the revision the course is
+    regenerated from, if any. Section calls wrapped with ``wrap`` reuse its
+    result when their inputs are unchanged and record their result either
+    way, so the new revision can in turn be edited later.
+    """
+
+    def __init__(self, lesson_plan, previous=None):
+        self.lesson_plan = lesson_plan
+        self.previous = previous
+        self.outline = []
+        self.sections = {}
+        # Keys of the sections taken from the previous revision; identical
+        # calls (e.g. two units with the same objectives) share one key.
+        self.reused = set()
+        self._lock = threading.Lock()
+
+    def changes(self):
+        """Changed lesson plan fields; every field if there is no previous."""
+        old_plan = self.previous["lesson_plan"] if self.previous else {}
+        return changed_fields(old_plan, self.lesson_plan)
+
+    def affects(self, part):
+        return self.previous is None or part in affected(self.changes())
+
+    def wrap(self, fn, inputs):
+        """Wraps a section call so unchanged inputs reuse the previous result."""
+        key = section_hash(inputs)
+        previous = (self.previous or {}).get("sections", {})
+
+        def revised(**kwargs):
+            if key in previous:
+                value = previous[key]
+                with self._lock:
+                    self.reused.add(key)
+            else:
+                value = fn(**kwargs)
+            with self._lock:
+                self.sections[key] = value
+            return value
+
+        return revised
+
+    def stats(self):
+        """Changed fields, and how many distinct sections the revision has
+        and how many of those were reused."""
+        with self._lock:
+            return {
+                "changed_fields": self.changes() if self.previous else [],
+                "sections": len(self.sections),
+                "reused": len(self.reused),
+            }
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "lesson_plan": self.lesson_plan,
+                "outline": self.outline,
+                "sections": dict(self.sections),
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+from metrics import LLM_HEDGES
+from prompts import token_budget
+from scheduler import LLM_MAX_CONCURRENCY
+
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# Latencies a signature needs before its calls are hedged.
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))
+# Extra spend cap: at most this fraction of calls sends a duplicate request,
+# with up to HEDGE_BURST duplicates saved up while calls are fast.
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.05"))
+HEDGE_BURST = float(os.getenv("HEDGE_BURST", "3"))
+
+# Model, output budget (see prompts.TOKEN_BUDGETS), timeout in seconds and
+# whether slow calls are hedged, per signature. Timeouts allow for the
+# budget at ~30 tokens/s; a timed-out call is retried by the scheduler.
+DEFAULT_ROUTES = {
+    "Promot2Outline": {"timeout": 180},
+    "ReviseOutline": {"timeout": 180},
+    "UnitBundle": {"timeout": 180},
+    "ObjectiveQuestions": {"timeout": 150},
+    "ObjectiveContent": {"timeout": 100},
+    "EssayQuestions": {"timeout": 60},
+    "ObjectiveProject": {"timeout": 60},
+    "TermsndDefinitions": {"timeout": 45},
+    "UnitIntroduction": {"timeout": 45},
+    "LearningActivity": {"timeout": 45},
+    "Discussion4Objective": {"timeout": 30},
+}
+# JSON object merged into the table per signature, e.g.
+# MODEL_ROUTES='{"ObjectiveContent": {"model": "gpt-4o-mini", "hedge": false}}'.
+_overrides = json.loads(os.getenv("MODEL_ROUTES") or "{}")
+ROUTES = {
+    name: {**DEFAULT_ROUTES.get(name, {}), **_overrides.get(name, {})}
+    for name in {**DEFAULT_ROUTES, **_overrides}
+}
+
+
+def route(signature):
+    """Returns the model, max_tokens, timeout and hedging of ``signature``."""
+    name = signature if isinstance(signature, str) else signature.__name__
+    settings = ROUTES.get(name, {})
+    max_tokens = settings.get("max_tokens")
+    if max_tokens is None and not isinstance(signature, str):
+        max_tokens = token_budget(signature)
+    return {
+        "model": settings.get("model", DEFAULT_MODEL),
+        "max_tokens": max_tokens,
+        "timeout": settings.get("timeout", DEFAULT_TIMEOUT),
+        "hedge": settings.get("hedge", True),
+    }
+
+
+def call_config(signature, lm):
+    """LM keyword arguments for a call of ``signature`` made with ``lm``.
+
+    ``route`` names the signature for ``InstrumentedOpenAI``, which removes
+    it before the request is made. The routed model only applies to OpenAI
+    clients; other LMs, such as the benchmark fakes, keep their own.
+    """
+    settings = route(signature)
+    config = {"timeout": settings["timeout"], "route": signature.__name__}
+    if getattr(lm, "provider", None) == "openai":
+        config["model"] = settings["model"]
+    if settings["max_tokens"]:
+        config["max_tokens"] = settings["max_tokens"]
+    return config
+
+
+def _release_when_done(futures, release):
+    """Calls ``release()`` once every one of ``futures`` is done."""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            release()
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+class Hedger:
+    """Sends a duplicate of a slow LM call and keeps whichever answers first.
+
+    The latencies of each signature's recent calls are kept; once a call has
+    run longer than their ``percentile`` since the scheduler admitted it, a
+    second identical request is made and the first successful response wins.
+    The loser is left to finish in the background, since a synchronous
+    request cannot be cancelled, so duplicates are limited to ``max_ratio``
+    of all calls and are only sent when the scheduler has room to spare.
+    """
+
+    def __init__(
+        self,
+        percentile=HEDGE_PERCENTILE,
+        min_samples=HEDGE_MIN_SAMPLES,
+        window=HEDGE_WINDOW,
+        max_ratio=HEDGE_MAX_RATIO,
+        burst=HEDGE_BURST,
+        max_workers=2 * LLM_MAX_CONCURRENCY,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self.credit = burst
+        self._latencies = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="hedge"
+        )
+
+    def delay(self, name):
+        """Seconds after which a call of ``name`` is hedged, or None."""
+        with self._lock:
+            latencies = sorted(self._latencies.get(name, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[int(self.percentile / 100 * (len(latencies) - 1))]
+
+    def _record(self, name, latency):
+        with self._lock:
+            if name not in self._latencies:
+                self._latencies[name] = deque(maxlen=self.window)
+            self._latencies[name].append(latency)
+
+    def _take_credit(self):
+        with self._lock:
+            if self.credit < 1:
+                return False
+            self.credit -= 1
+            return True
+
+    def _submit(self, fn):
+        # The copied context carries the scheduler priority and open span.
+        return self._executor.submit(contextvars.copy_context().run, fn)
+
+    def _hedge_after(self, name):
+        """Accrues credit for a new call and returns its hedging delay."""
+        with self._lock:
+            self.credit = min(self.burst, self.credit + self.max_ratio)
+        return self.delay(name) if route(name)["hedge"] else None
+
+    def _hedgeable(self, delay, scheduler):
+        """Whether a call could be hedged at all, so calls that cannot be
+        run inline instead of in the pool."""
+        return delay is not None and self.credit >= 1 and not scheduler.queued()
+
+    def _admit_backup(self, name, scheduler, tokens):
+        """Takes credit and an immediate scheduler slot for a duplicate of a
+        slow call of ``name``. No duplicate is sent while other calls wait
+        for admission, since they would then wait longer still."""
+        if not scheduler.try_acquire(tokens):
+            LLM_HEDGES.labels(name, "queued").inc()
+            return False
+        if not self._take_credit():
+            scheduler.release()
+            LLM_HEDGES.labels(name, "capped").inc()
+            return False
+        LLM_HEDGES.labels(name, "sent").inc()
+        return True
+
+    def run(self, name, fn, scheduler, tokens):
+        """Returns ``fn()``, hedged if ``name``'s route allows it.
+
+        Called once ``scheduler`` has admitted the call (see
+        ``LLMScheduler.run``), so its latency is timed from admission. The
+        duplicate is charged ``tokens`` and holds a scheduler slot until both
+        requests have finished.
+        """
+        delay = self._hedge_after(name)
+        start = time.monotonic()
+        if not self._hedgeable(delay, scheduler):
+            result = fn()
+            self._record(name, time.monotonic() - start)
+            return result
+        primary = self._submit(fn)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._admit_backup(name, scheduler, tokens):
+            result = primary.result()
+            self._record(name, time.monotonic() - start)
+            return result
+        backup = self._submit(fn)
+        _release_when_done([primary, backup], scheduler.release)
+        error = None
+        for future in as_completed([primary, backup]):
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if future is backup:
+                LLM_HEDGES.labels(name, "won").inc()
+            self._record(name, time.monotonic() - start)
+            return result
+        raise error
+
+    async def arun(self, name, fn, scheduler, tokens):
+        """Like ``run`` for a coroutine function ``fn``. The losing request
+        is cancelled rather than left running."""
+        delay = self._hedge_after(name)
+        start = time.monotonic()
+        if not self._hedgeable(delay, scheduler):
+            result = await fn()
+            self._record(name, time.monotonic() - start)
+            return result
+        primary = asyncio.ensure_future(fn())
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done or not self._admit_backup(name, scheduler, tokens):
+            result = await primary
+            self._record(name, time.monotonic() - start)
+            return result
+        backup = asyncio.ensure_future(fn())
+        _release_when_done([primary, backup], scheduler.release)
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        continue
+                    if future is backup:
+                        LLM_HEDGES.labels(name, "won").inc()
+                    self._record(name, time.monotonic() - start)
+                    return future.result()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def stats(self):
+        with self._lock:
+            names = list(self._latencies)
+            credit = self.credit
+        return {
+            "credit": round(credit, 2),
+            "hedge_after_seconds": {name: self.delay(name) for name in names},
+        }
+
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger():
+    """Returns the process-wide hedger, creating it on first use."""
+    global _hedger
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger()
+        return _hedger
@@ -0,0 +1,381 @@
+import os
+import time
+import heapq
+import asyncio
+import random
+import logging
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from metrics import LLM_CONCURRENCY_LIMIT, LLM_IN_FLIGHT, LLM_RETRIES
+
+LLM_RPM = float(os.getenv("LLM_RPM", "3500"))
+LLM_TPM = float(os.getenv("LLM_TPM", "160000"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+# Completions slower than this shrink the concurrency limit.
+LLM_TARGET_LATENCY = float(os.getenv("LLM_TARGET_LATENCY", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+
+INTERACTIVE = 0
+BATCH = 10
+
+TRANSIENT_ERRORS = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "InternalServerError",
+    "ServiceUnavailableError",
+    "Timeout",
+}
+
+logger = logging.getLogger(__name__)
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """Runs LM calls made inside the block at ``level`` (lower goes first)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(prompt, max_tokens):
+    """Upper estimate of the tokens a request counts against the TPM limit."""
+    return len(prompt) // 4 + (max_tokens or 0)
+
+
+def is_rate_limit(error):
+    return (
+        getattr(error, "status_code", None) == 429
+        or type(error).__name__ == "RateLimitError"
+    )
+
+
+def is_transient(error):
+    status = getattr(error, "status_code", None)
+    return type(error).__name__ in TRANSIENT_ERRORS or (status or 0) >= 500
+
+
+class TokenBucket:
+    """Budget of ``per_minute`` units refilled continuously."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount):
+        """Seconds until ``amount`` units are available."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class LLMScheduler:
+    """Admission control shared by every LM call in the process.
+
+    Requests wait in priority order until the requests-per-minute and
+    tokens-per-minute buckets have room and fewer than ``limit`` calls are
+    in flight. The limit grows by one per ``limit`` successful calls and is
+    halved on a 429 (or cut by 10% when completions exceed the target
+    latency), so concurrency settles just below what the API accepts.
+    Rate-limited and transient failures are retried with jittered
+    exponential backoff.
+    """
+
+    def __init__(
+        self,
+        rpm=LLM_RPM,
+        tpm=LLM_TPM,
+        min_limit=LLM_MIN_CONCURRENCY,
+        max_limit=LLM_MAX_CONCURRENCY,
+        initial_limit=LLM_INITIAL_CONCURRENCY,
+        target_latency=LLM_TARGET_LATENCY,
+        max_retries=LLM_MAX_RETRIES,
+        base_backoff=1.0,
+        max_backoff=60.0,
+    ):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(initial_limit)
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.in_flight = 0
+        self.rate_limited = 0
+        self._cooldown_until = 0.0
+        self._waiting = []
+        self._async_waiters = {}
+        self._sequence = itertools.count()
+        self._changed = threading.Condition()
+        LLM_CONCURRENCY_LIMIT.set(self.limit)
+
+    def run(self, fn, tokens, level=None, used_tokens=None, hedge=None):
+        """Calls ``fn()`` once admitted, retrying rate-limited attempts.
+
+        ``tokens`` is the estimate charged to the TPM bucket up front;
+        ``used_tokens(result)``, if given, returns the actual usage so the
+        unused part of the estimate is handed back. ``hedge(fn)``, if given,
+        makes each admitted attempt in place of ``fn()`` (see
+        ``routing.Hedger``), so time spent queued never counts as latency.
+        """
+        level = _priority.get() if level is None else level
+        for attempt in range(self.max_retries + 1):
+            self._acquire(tokens, level)
+            start = time.monotonic()
+            try:
+                result = hedge(fn) if hedge else fn()
+            except BaseException as e:
+                backoff = self._retry_after(e, tokens, attempt)
+                if backoff is None:
+                    raise
+                time.sleep(backoff)
+                continue
+            refund = tokens - used_tokens(result) if used_tokens else 0
+            self._release(refund, latency=time.monotonic() - start)
+            return result
+
+    async def arun(self, fn, tokens, level=None, used_tokens=None, hedge=None):
+        """Like ``run`` for a coroutine function ``fn``.
+
+        Waiting for admission and backing off happen on the event loop, so
+        thousands of queued calls cost no threads.
+        """
+        level = _priority.get() if level is None else level
+        for attempt in range(self.max_retries + 1):
+            await self._aacquire(tokens, level)
+            start = time.monotonic()
+            try:
+                result = await (hedge(fn) if hedge else fn())
+            except BaseException as e:
+                backoff = self._retry_after(e, tokens, attempt)
+                if backoff is None:
+                    raise
+                await asyncio.sleep(backoff)
+                continue
+            refund = tokens - used_tokens(result) if used_tokens else 0
+            self._release(refund, latency=time.monotonic() - start)
+            return result
+
+    def stream(self, fn, tokens, level=None):
+        """Like ``run`` for a ``fn`` returning an iterator, such as a streamed
+        completion, whose items are yielded.
+
+        The call holds its slot, and its latency is timed, until the iterator
+        is used up or closed. Only opening the stream is retried.
+        """
+        level = _priority.get() if level is None else level
+        for attempt in range(self.max_retries + 1):
+            self._acquire(tokens, level)
+            start = time.monotonic()
+            try:
+                items = fn()
+            except BaseException as e:
+                backoff = self._retry_after(e, tokens, attempt)
+                if backoff is None:
+                    raise
+                time.sleep(backoff)
+                continue
+            break
+        try:
+            yield from items
+        except BaseException as e:
+            self._release(rate_limited=isinstance(e, Exception) and is_rate_limit(e))
+            raise
+        self._release(latency=time.monotonic() - start)
+
+    def _retry_after(self, error, tokens, attempt):
+        """Releases the slot of a failed attempt and returns how long to back
+        off before retrying it, or None if it is not to be retried."""
+        if not isinstance(error, Exception):
+            # Cancelled or interrupted: free the slot, never retry.
+            self._release()
+            return None
+        rate_limited = is_rate_limit(error)
+        backoff = self._backoff(attempt)
+        self._release(tokens, rate_limited=rate_limited, cooldown=backoff)
+        if attempt == self.max_retries or not (rate_limited or is_transient(error)):
+            return None
+        LLM_RETRIES.labels("rate_limit" if rate_limited else "error").inc()
+        logger.warning(
+            "LM call failed (%s), retry %s in %.1fs", error, attempt + 1, backoff
+        )
+        return backoff
+
+    def _backoff(self, attempt):
+        delay = min(self.max_backoff, self.base_backoff * 2**attempt)
+        return delay * random.uniform(0.5, 1.5)
+
+    def _admit(self, ticket, tokens):
+        """Admits ``ticket`` if it is first in line and there is room.
+
+        Returns 0 once admitted, otherwise how long to wait before trying
+        again (None to wait for a notification). Called with the lock held.
+        """
+        if self._waiting[0] != ticket or self.in_flight >= int(self.limit):
+            return None
+        delay = max(
+            self._cooldown_until - time.monotonic(),
+            self.requests.delay(1),
+            self.tokens.delay(tokens),
+        )
+        if delay > 0:
+            return delay
+        heapq.heappop(self._waiting)
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.in_flight += 1
+        LLM_IN_FLIGHT.set(self.in_flight)
+        self._notify()
+        return 0
+
+    def _abandon(self, ticket):
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._notify()
+
+    def _notify(self):
+        """Wakes waiting threads and, if it is waiting on an event loop, the
+        call first in line. Called with the lock held."""
+        self._changed.notify_all()
+        waiter = self._waiting and self._async_waiters.get(self._waiting[0])
+        if waiter:
+            loop, event = waiter
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The loop has closed; its waiter is gone with it.
+                pass
+
+    def _acquire(self, tokens, level):
+        ticket = (level, next(self._sequence))
+        with self._changed:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    delay = self._admit(ticket, tokens)
+                    if delay == 0:
+                        return
+                    self._changed.wait(delay)
+            except BaseException:
+                self._abandon(ticket)
+                raise
+
+    async def _aacquire(self, tokens, level):
+        ticket = (level, next(self._sequence))
+        event = asyncio.Event()
+        with self._changed:
+            heapq.heappush(self._waiting, ticket)
+            self._async_waiters[ticket] = (asyncio.get_running_loop(), event)
+        try:
+            while True:
+                with self._changed:
+                    event.clear()
+                    delay = self._admit(ticket, tokens)
+                if delay == 0:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._changed:
+                self._abandon(ticket)
+            raise
+        finally:
+            with self._changed:
+                self._async_waiters.pop(ticket, None)
+
+    def try_acquire(self, tokens):
+        """Admits an extra call, such as a hedge, only if no call is waiting
+        and there is room right now; returns whether it was admitted. An
+        admitted call is ended with ``release``."""
+        ticket = (INTERACTIVE, next(self._sequence))
+        with self._changed:
+            if self._waiting:
+                return False
+            heapq.heappush(self._waiting, ticket)
+            if self._admit(ticket, tokens) == 0:
+                return True
+            self._abandon(ticket)
+            return False
+
+    def release(self):
+        """Ends a call admitted by ``try_acquire``."""
+        self._release()
+
+    def queued(self):
+        """Number of calls waiting for admission."""
+        with self._changed:
+            return len(self._waiting)
+
+    def _release(self, refund=0, latency=None, rate_limited=False, cooldown=0.0):
+        with self._changed:
+            self.in_flight -= 1
+            if refund > 0:
+                self.tokens.give(refund)
+            if rate_limited:
+                self.rate_limited += 1
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._cooldown_until = max(
+                    self._cooldown_until, time.monotonic() + cooldown
+                )
+            elif latency is not None and latency > self.target_latency:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            LLM_CONCURRENCY_LIMIT.set(self.limit)
+            LLM_IN_FLIGHT.set(self.in_flight)
+            self._notify()
+
+    def set_max_limit(self, max_limit):
+        """Caps how many calls may ever be in flight at once."""
+        with self._changed:
+            self.max_limit = max(self.min_limit, max_limit)
+            self.limit = min(self.limit, self.max_limit)
+            LLM_CONCURRENCY_LIMIT.set(self.limit)
+
+    def stats(self):
+        with self._changed:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiting),
+                "rate_limited": self.rate_limited,
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Returns the process-wide scheduler, creating it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
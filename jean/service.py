@@ -0,0 +1,209 @@
+"""Signatures and prompts of the Flask course service (``app copy.py``).
+
+The asyncio service (``app_async``) builds courses from these same calls, so
+both return identical courses and share their cached completions.
+"""
+import dspy
+
+from llm import predict
+from outline import parse_objectives
+from prompts import compacted, format_objectives
+from reuse import predict_similar
+
+
+@compacted
+class Promot2Outline(dspy.Signature):
+    prompt = dspy.InputField()
+    course_outline = dspy.OutputField(
+        desc="""For each unit,
+            create a unit NAME, DESCRIPTION, and a list of 2-3 OBJECTIVES for /
+            each unit. The unit description should be 1-2 paragraphs. /
+            Refer to the students as “students”. The Result must start /
+              with a Bloom’s verb and be measurable and specific. /
+              The tone should have an active and engaging tone.
+            Divide the course info into the exact number of number_of_weeks,
+            Generate for all number of weeks specified, do not shorten the /
+            response
+            Don't add trailing comments. just returning the units is okay
+            """
+    )
+
+
+@compacted
+class UnitIntroduction(dspy.Signature):
+    prompt = dspy.InputField()
+    unit_description = dspy.OutputField(
+        desc="""Create a 2-3 paragraph unit introduction discussing /
+          what students will learn in the unit.
+          Discuss why this information is important and how it relates to /
+          their future career in computer science."""
+    )
+
+
+@compacted
+class ObjectiveContent(dspy.Signature):
+    objective = dspy.InputField()
+    course_content = dspy.OutputField(
+        desc="""Provide students with detailed information about how to learn /
+        about this objective. Be very detailed and specific in the response.
+        Provide all important information students must know to understand /
+        this unit outcomes. Include any links to open source resources or /
+        Internet resources that are available on this topic.
+        Provide the URL to all links and resources."""
+    )
+
+
+@compacted
+class Discussion4Objective(dspy.Signature):
+    objective = dspy.InputField()
+    discussion_questions = dspy.OutputField(
+        desc="""Create a discussion question that relates to the unit /
+        objective of <Unit xx objective xx> Whenever possible, /
+        have students apply the concepts to their personal lives or careers."""
+    )
+
+
+@compacted
+class TermsndDefinitions(dspy.Signature):
+    objective = dspy.InputField()
+    terms_and_definition = dspy.OutputField(
+        desc="""Create a list of terms and definitions related to objective"""
+    )
+
+
+@compacted
+class LearningActivity(dspy.Signature):
+    objective = dspy.InputField()
+    learning_activity = dspy.OutputField(
+        desc="""Create 1 learning activity to /
+        practice the objective"""
+    )
+
+
+@compacted
+class ObjectiveQuestions(dspy.Signature):
+    objective = dspy.InputField()
+    objective_questions_25 = dspy.OutputField(
+        desc="""Create a 25-question objective test based on this unit’s /
+        content that relates to the following objectives /
+        in the input. Provide the answer key and rubric."""
+    )
+
+
+@compacted
+class ObjectiveProject(dspy.Signature):
+    objective = dspy.InputField()
+    project = dspy.OutputField(
+        desc="""Create a project that students need to complete related /
+        to the objectives. The project can be a paper, presentation, /
+        research, designing a product/service, etc. Provide a rubric /
+        and answer key."""
+    )
+
+
+def outline_prompt(lesson_plan):
+    """Asks Promot2Outline for the units of the course in ``lesson_plan``."""
+    grade_level = lesson_plan.get("grade_level")
+    subject = lesson_plan.get("subject")
+    course_name = lesson_plan.get("course_name")
+    course_description = lesson_plan.get("course_description")
+    course_outcomes = lesson_plan.get("course_outcomes")
+    number_of_weeks = lesson_plan.get("number_of_weeks")
+    return f"""
+        <complete_response>
+        You are an instructional designer and faculty member for a school /
+        teaching {grade_level} {subject} courses.
+        You are developing a "{grade_level}" level {subject} /
+        course called {course_name}. The course description is /
+        {course_description}.
+        The outcomes of the course include {course_outcomes}
+        Based on this information, you will divide this course into /
+        {number_of_weeks} units. return complete response for the total division
+    """
+
+
+def unit_tasks(unit, use_cache=True):
+    """Builds the LM calls of a unit and its objectives, in the order the
+    Flask service makes them.
+
+    Each is ``(target, key, fn, inputs)``: ``fn(**inputs)`` is stored as
+    ``target[key]``, like the tasks of ``app.unit_tasks``.
+    """
+    unit["objectives"] = parse_objectives(unit["objectives"])
+    objectives = format_objectives(unit["objectives"])
+    unit_prompt = f"""
+        Unit {unit['unit_number']} will cover the following topics: {unit['description']}
+        The unit {unit['unit_number']} objectives are:
+        {objectives}
+    """
+
+    def section(target, key, signature, output_field, **inputs):
+        inputs = dict(
+            inputs,
+            signature=signature,
+            output_field=output_field,
+            use_cache=use_cache,
+        )
+        return target, key, predict, inputs
+
+    def similar(target, key, signature, output_field, **inputs):
+        inputs["similar_to"] = target["description"]
+        _, _, _, inputs = section(target, key, signature, output_field, **inputs)
+        return target, key, predict_similar, inputs
+
+    tasks = [
+        section(
+            unit,
+            "introduction",
+            UnitIntroduction,
+            "unit_description",
+            prompt=unit_prompt,
+        ),
+        section(
+            unit,
+            "learning_activity",
+            LearningActivity,
+            "learning_activity",
+            objective=f"""As a student, I need a hands-on practice /
+        activity that directly engages me in practicing each of the /
+        specified objectives:
+        {objectives}""",
+        ),
+        section(
+            unit,
+            "questions",
+            Discussion4Objective,
+            "discussion_questions",
+            objective=objectives,
+        ),
+        section(
+            unit,
+            "assessment",
+            ObjectiveQuestions,
+            "objective_questions_25",
+            objective=objectives,
+        ),
+        section(unit, "project", ObjectiveProject, "project", objective=objectives),
+    ]
+    for objective in unit["objectives"]:
+        tasks.append(
+            similar(
+                objective,
+                "content",
+                ObjectiveContent,
+                "course_content",
+                objective=f"""Next you will /
+            create the course content for {unit['unit_number']} /
+            One of the objectives is to {objective['description']}.""",
+            )
+        )
+        tasks.append(
+            similar(
+                objective,
+                "terms_nd_definition",
+                TermsndDefinitions,
+                "terms_and_definition",
+                objective=objective["description"],
+            )
+        )
+    return tasks
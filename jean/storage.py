@@ -0,0 +1,154 @@
+import io
+import os
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+S3_BUCKET = os.getenv("S3_BUCKET", "dev-vecul-media-assets")
+# Points the client at a local stand-in such as MinIO or moto_server.
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+UPLOAD_ARTIFACTS = os.getenv("UPLOAD_ARTIFACTS", "").lower() in ("1", "true")
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+
+# Large courses are sent as a multipart upload in 8 MB parts.
+UPLOAD_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024
+)
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+_uploads = None
+_uploads_lock = threading.Lock()
+
+
+def get_s3_client():
+    """Returns the process-wide S3 client, creating it on first use.
+
+    boto3 clients are thread-safe, so one client and its connection pool are
+    shared by every request instead of resolving credentials per course.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.session.Session().client(
+                    "s3",
+                    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                    endpoint_url=S3_ENDPOINT_URL,
+                    config=Config(
+                        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                        retries={"max_attempts": 5, "mode": "adaptive"},
+                        tcp_keepalive=True,
+                    ),
+                )
+    return _client
+
+
+def set_s3_client(client):
+    """Replaces the shared client, e.g. with one bound to a local stand-in."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def upload_fileobj(fileobj, bucket_name, s3_key, content_type=None):
+    extra_args = {"ContentType": content_type} if content_type else None
+    get_s3_client().upload_fileobj(
+        fileobj, bucket_name, s3_key, ExtraArgs=extra_args, Config=UPLOAD_CONFIG
+    )
+
+
+def download_bytes(bucket_name, s3_key):
+    response = get_s3_client().get_object(Bucket=bucket_name, Key=s3_key)
+    return response["Body"].read()
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.warning("Background upload failed: %s", future.exception())
+
+
+def upload_in_background(body, bucket_name, s3_key, content_type=None):
+    """Uploads ``body`` on a shared background pool and returns its future.
+
+    For files a request need not wait for, such as the JSON copies uploaded
+    next to a course document. Failures are logged rather than raised.
+    """
+    global _uploads
+    with _uploads_lock:
+        if _uploads is None:
+            _uploads = ThreadPoolExecutor(
+                max_workers=UPLOAD_WORKERS, thread_name_prefix="uploads"
+            )
+    future = _uploads.submit(
+        upload_fileobj, io.BytesIO(body), bucket_name, s3_key, content_type
+    )
+    future.add_done_callback(_log_failure)
+    return future
+
+
+class ArtifactUploader:
+    """Uploads intermediate JSON artifacts while generation carries on.
+
+    Each artifact is serialised when it is handed over and put under
+    ``prefix`` on a small background pool. Failures are logged rather than
+    raised, since the artifacts are a by-product of the course document.
+    Used as a context manager, the pool is closed when the block ends,
+    whether or not the course was built.
+    """
+
+    def __init__(self, bucket_name, prefix, enabled=None):
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.enabled = UPLOAD_ARTIFACTS if enabled is None else enabled
+        self._futures = []
+        self._executor = None
+        if self.enabled:
+            self._executor = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="artifacts"
+            )
+
+    def put_json(self, name, data):
+        if not self.enabled:
+            return
+        body = json.dumps(data).encode("utf-8")
+        key = f"{self.prefix}/{name}"
+        future = self._executor.submit(self._put, key, body)
+        future.add_done_callback(_log_failure)
+        self._futures.append(future)
+
+    def _put(self, key, body):
+        get_s3_client().put_object(
+            Bucket=self.bucket_name,
+            Key=key,
+            Body=body,
+            ContentType="application/json",
+        )
+
+    def wait(self):
+        """Blocks until every queued artifact has been uploaded or failed."""
+        if not self.enabled:
+            return
+        wait(self._futures)
+        self._executor.shutdown()
+
+    def close(self):
+        """Takes no more artifacts; those queued still upload, in the
+        background."""
+        if self.enabled:
+            self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
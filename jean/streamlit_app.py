@@ -0,0 +1,171 @@
+"""Streamlit front end for the course generator.
+
+Streamlit re-executes this script on every widget interaction, so it only
+imports Streamlit and the job queue. The generation pipeline in ``app``
+(dspy, OpenAI, boto3, python-docx and the caches) is imported on the first
+generation and kept for the life of the process by ``st.cache_resource``.
+
+Generations run on a worker pool shared by every session (``jobs.JobQueue``)
+rather than in the script thread. Each session keeps its job in
+``st.session_state`` and polls it, so reruns neither interrupt nor repeat a
+generation and finished units stay on screen.
+"""
+import json
+import time
+
+import streamlit as st
+
+from jobs import JobQueue, QueueFull
+
+POLL_SECONDS = 1.0
+
+
+@st.cache_resource(show_spinner="Loading the course generator...")
+def load_pipeline():
+    """Imports the generation pipeline and creates its OpenAI client once."""
+    import app
+
+    app.get_lm()
+    return app
+
+
+@st.cache_resource
+def job_queue():
+    """The process-wide pool that runs every session's generations."""
+    return JobQueue()
+
+
+def run_generation(job, pipeline, lesson_plan_json, use_cache, previous_course_id):
+    """Runs ``generate_question`` for a job, publishing its progress."""
+
+    def on_event(event, payload):
+        if event == "outline":
+            job.start(len(payload))
+        elif event == "unit":
+            job.advance()
+            job.publish("unit", payload)
+
+    response = pipeline.generate_question(
+        lesson_plan_json,
+        use_cache=use_cache,
+        on_event=on_event,
+        previous_course_id=previous_course_id,
+    )
+    if not isinstance(response, str):
+        raise RuntimeError(response[0]["error"])
+    return response
+
+
+def render_unit(unit, sections):
+    """Shows a generated unit while the rest of the course is still running."""
+    with st.expander(unit["title"], expanded=unit["unit_number"] == 1):
+        st.write(unit["description"])
+        st.markdown(unit["introduction"])
+        for objective in unit["objectives"]:
+            st.subheader(f"Objective {objective['objective_number']}")
+            st.markdown(objective["content"])
+            st.markdown("**Terms and Definitions**")
+            st.markdown(objective["terms_nd_definition"])
+        for section in sections:
+            st.subheader(section.capitalize().replace("_", " "))
+            st.markdown(unit[section])
+
+
+def show_job(job, sections):
+    """Renders a generation's progress and the units finished so far.
+
+    While the job runs the script reruns every ``POLL_SECONDS`` to show new
+    units; the job itself carries on in the pool whatever the script does.
+    """
+    units_total = job.units_total or 1
+    if job.finished_at is None:
+        text = "Generating outline..."
+        if job.units_total is not None:
+            text = f"{job.units_done} of {units_total} units ready"
+        st.progress(job.units_done / units_total, text=text)
+    for _, unit in list(job.events):
+        render_unit(unit, sections)
+
+    if job.status == "done":
+        st.write("Success! ")
+        st.write(f"https://{job.result}")
+        st.session_state["course_id"] = job.result.rsplit("/", 1)[-1].split(".")[0]
+    elif job.status == "failed":
+        st.error(f"Error generating question: {job.error}")
+    else:
+        time.sleep(POLL_SECONDS)
+        st.rerun()
+
+
+def main():
+    if "course_outcomes" not in st.session_state:
+        st.session_state["course_outcomes"] = []
+
+    # Text Input fields for lesson plan details
+    grade_level = st.text_input("Grade Level")
+    subject = st.text_input("Subject")
+    course_name = st.text_input("Course Name")
+    course_description = st.text_area("Course Description")
+
+    with st.expander("Course Outcomes"):
+        user_input = st.text_input("Enter course outcome")
+        add_button = st.button("Add", key="add_button")
+        if add_button:
+            if len(user_input) > 0:
+                st.session_state["course_outcomes"] += [user_input]
+                st.write(st.session_state["course_outcomes"])
+
+            else:
+                st.session_state["course_outcomes"] = []
+    course_outcomes = st.session_state["course_outcomes"]
+
+    number_of_weeks = st.number_input("Number of Weeks")
+
+    use_cache = st.checkbox("Reuse previously generated content", value=True)
+
+    # After an edit to the form, regenerate only what the edit affects.
+    previous_course_id = None
+    if st.session_state.get("course_id"):
+        revise = st.checkbox(
+            "Only regenerate what changed since the last course", value=False
+        )
+        if revise:
+            previous_course_id = st.session_state["course_id"]
+
+    job = st.session_state.get("job")
+    running = job is not None and job.finished_at is None
+    generate_button = st.button("Generate Course Outline", disabled=running)
+
+    if generate_button:
+        lesson_plan_data = {
+            "lesson_plan": {
+                "grade_level": grade_level,
+                "subject": subject,
+                "course_name": course_name,
+                "course_description": course_description,
+                "course_outcomes": course_outcomes,
+                "number_of_weeks": number_of_weeks,
+            }
+        }
+        lesson_plan_json = json.dumps(lesson_plan_data)
+        pipeline = load_pipeline()
+        try:
+            job = job_queue().submit(
+                run_generation,
+                pipeline,
+                lesson_plan_json,
+                use_cache,
+                previous_course_id,
+            )
+        except QueueFull:
+            st.warning("The generator is busy, please try again in a minute.")
+        else:
+            st.session_state["job"] = job
+            st.rerun()
+
+    if job is not None:
+        show_job(job, load_pipeline().UNIT_SECTIONS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules under test are imported by bare name, as the apps import them.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,25 @@
+from checkpoint import CheckpointStore
+
+
+def test_resume(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+    checkpoint = store.course("course")
+    piece = checkpoint.key("unit1.introduction", prompt="Unit 1")
+    checkpoint.save(piece, "saved introduction")
+    assert store.course("course").saved == {piece: "saved introduction"}
+    # A run bypassing the caches regenerates the piece and replaces it.
+    fresh = store.course("course", resume=False)
+    assert fresh.call("unit1.introduction", lambda prompt: "new", prompt="Unit 1") == (
+        "new"
+    )
+    assert store.course("course").saved == {piece: "new"}
+
+
+def test_key_depends_on_inputs(tmp_path):
+    checkpoint = CheckpointStore(str(tmp_path / "checkpoints.sqlite3")).course("c")
+    assert checkpoint.key("outline", prompt="4 weeks") != checkpoint.key(
+        "outline", prompt="5 weeks"
+    )
+    assert checkpoint.key("outline", prompt="4 weeks", use_cache=False) == (
+        checkpoint.key("outline", prompt="4 weeks")
+    )
@@ -0,0 +1,114 @@
+from outline import OutlineParser, parse_objectives, parse_outline
+
+
+def objectives(unit):
+    return [o["description"] for o in parse_objectives(unit["objectives"])]
+
+
+def test_headed_units():
+    units = parse_outline(
+        "Unit 1: Foundations\n"
+        "Variables and types.\n"
+        "Objectives:\n"
+        "1. Define a variable\n"
+        "2. Explain types\n"
+        "\n"
+        "Unit 2: Control flow\n"
+        "Branches and loops.\n"
+        "- Write a loop\n"
+    )
+    assert [u["title"] for u in units] == [
+        "Unit 1: Foundations",
+        "Unit 2: Control flow",
+    ]
+    assert units[0]["description"] == "Variables and types."
+    assert objectives(units[0]) == ["Define a variable", "Explain types"]
+    assert objectives(units[1]) == ["Write a loop"]
+
+
+def test_objectives_separated_by_blank_lines():
+    units = parse_outline(
+        "Unit 1: Foundations\n"
+        "Variables and types.\n"
+        "1. Define a\n"
+        "\n"
+        "2. Explain b\n"
+        "\n"
+        "3. Compare c\n"
+        "\n"
+        "Unit 2: Control flow\n"
+        "Branches.\n"
+        "1. Write a loop\n"
+    )
+    assert len(units) == 2
+    assert objectives(units[0]) == ["Define a", "Explain b", "Compare c"]
+
+
+def test_unheaded_objectives_separated_by_blank_lines():
+    units = parse_outline(
+        "Foundations\n"
+        "Variables and types.\n"
+        "1. Define a\n"
+        "\n"
+        "2. Explain b\n"
+        "\n"
+        "Control flow\n"
+        "Branches.\n"
+        "- Write a loop\n"
+    )
+    assert [u["title"] for u in units] == ["Foundations", "Control flow"]
+    assert objectives(units[0]) == ["Define a", "Explain b"]
+
+
+def test_numbered_unit_titles():
+    units = parse_outline(
+        "1. Introduction to programming\n"
+        "What programs are.\n"
+        "\n"
+        "2. Data structures\n"
+        "Lists and maps.\n"
+        "- Use a list\n"
+        "- Use a map\n"
+        "\n"
+        "3. Algorithms\n"
+        "Sorting.\n"
+        "1. Sort a list\n"
+        "2. Compare sorts\n"
+    )
+    assert [u["title"] for u in units] == [
+        "1. Introduction to programming",
+        "2. Data structures",
+        "3. Algorithms",
+    ]
+    assert units[1]["description"] == "Lists and maps."
+    assert objectives(units[1]) == ["Use a list", "Use a map"]
+    assert objectives(units[2]) == ["Sort a list", "Compare sorts"]
+
+
+def test_bullets_in_description_before_objectives_header():
+    units = parse_outline(
+        "Unit 1: Foundations\n"
+        "Students will meet:\n"
+        "- variables\n"
+        "- types\n"
+        "Objectives:\n"
+        "1. Define a variable\n"
+    )
+    assert units[0]["description"] == "Students will meet:\n- variables\n- types"
+    assert objectives(units[0]) == ["Define a variable"]
+
+
+def test_units_close_as_the_next_one_starts():
+    text = (
+        "Unit 1: Foundations\nVariables.\n1. Define a\n\n2. Explain b\n\n"
+        "Unit 2: Control flow\nBranches.\n1. Write a loop\n"
+    )
+    parser = OutlineParser()
+    closed = []
+    for i in range(0, len(text), 7):
+        closed += [u["unit_number"] for u in parser.feed(text[i : i + 7])]
+        if "Unit 2: Control flow\n" in text[: i + 7]:
+            assert closed == [1]
+    closed += [u["unit_number"] for u in parser.close()]
+    assert closed == [1, 2]
+    assert parser.units == parse_outline(text)
@@ -0,0 +1,35 @@
+from outline import parse_outline
+from prompts import compact
+from revision import format_outline
+
+
+def test_compact():
+    text = """
+        First line continues /
+        here.   Extra   spaces.
+
+
+        Next paragraph.
+    """
+    assert compact(text) == "First line continues here. Extra spaces.\n\nNext paragraph."
+
+
+def test_compact_keeps_units_of_an_outline_apart():
+    units = [
+        {
+            "title": "Foundations of Algorithms",
+            "description": "Students meet the basic ideas.",
+            "objectives": ["1. Define an algorithm.", "2. Trace a simple loop."],
+        },
+        {
+            "title": "Sorting and Searching",
+            "description": "Students compare classic methods.",
+            "objectives": ["1. Implement binary search.", "2. Compare sorts."],
+        },
+    ]
+    parsed = parse_outline(compact(format_outline(units)))
+    assert [unit["title"] for unit in parsed] == [
+        "Foundations of Algorithms",
+        "Sorting and Searching",
+    ]
+    assert [len(unit["objectives"]) for unit in parsed] == [2, 2]
@@ -0,0 +1,46 @@
+from reuse import SimilarityIndex, adapt, key_tokens
+
+
+def test_key_tokens():
+    assert key_tokens("Explain the causes of World War II.") == {"world", "war", "ii"}
+    assert key_tokens("Solve equations with 2 variables") == {"2"}
+
+
+def test_lookup_reuses_near_identical_objectives(tmp_path):
+    index = SimilarityIndex(str(tmp_path / "index"))
+    index.add("Explain the causes of World War I.", "content")
+    match = index.lookup("Explain the causes of World War I")
+    assert match is not None and match[0] == "content"
+
+
+def test_lookup_keeps_apart_objectives_naming_different_things(tmp_path):
+    index = SimilarityIndex(str(tmp_path / "index"), threshold=0.9)
+    index.add("Explain the causes of World War I.", "WWI content")
+    assert index.lookup("Explain the causes of World War II.") is None
+    index.add("Explain the causes of World War II.", "WWII content")
+    assert index.lookup("Explain the causes of World War II")[0] == "WWII content"
+
+
+def test_lookup_skips_missing_values(tmp_path):
+    index = SimilarityIndex(str(tmp_path / "index"))
+    index.add("Define a stack.", None)
+    assert index.lookup("Define a stack.") is None
+
+
+def test_adapt():
+    assert adapt("To define a stack, ...", "define a stack", "define stacks") == (
+        "To define stacks, ..."
+    )
+    assert adapt(None, "define a stack", "define stacks") is None
+
+
+def test_vectors_saved_out_of_file_order_are_embedded_again(tmp_path):
+    path = str(tmp_path / "index")
+    first, second = SimilarityIndex(path), SimilarityIndex(path)
+    second.add("Explain recursion.", "recursion content")
+    first.add("Define a stack.", "stack content")
+    # The file now lists recursion first, but this matrix starts with stack.
+    first.save()
+    index = SimilarityIndex(path)
+    assert index.lookup("Define a stack.")[0] == "stack content"
+    assert index.lookup("Explain recursion.")[0] == "recursion content"
@@ -0,0 +1,19 @@
+from revision import Revision
+
+
+def run(revision, objectives):
+    for objective in objectives:
+        call = revision.wrap(lambda **inputs: "content", {"objective": objective})
+        call(objective=objective)
+
+
+def test_stats_count_each_section_once():
+    previous = Revision({"number_of_weeks": 4})
+    run(previous, ["Define a stack.", "Define a queue.", "Define a stack."])
+    revision = Revision({"number_of_weeks": 5}, previous.to_dict())
+    run(revision, ["Define a stack.", "Define a queue.", "Define a stack.", "Sort."])
+    assert revision.stats() == {
+        "changed_fields": ["number_of_weeks"],
+        "sections": 3,
+        "reused": 2,
+    }
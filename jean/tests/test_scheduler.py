@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from scheduler import LLMScheduler
+
+
+def test_run_releases_after_failure():
+    scheduler = LLMScheduler(max_retries=0)
+
+    def fail():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.run(fail, 10)
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_cancelled_call_releases_its_slot():
+    scheduler = LLMScheduler(initial_limit=1, max_limit=1)
+    calls = []
+
+    async def hang():
+        calls.append(1)
+        await asyncio.sleep(60)
+
+    async def main():
+        task = asyncio.ensure_future(scheduler.arun(hang, 10))
+        while not calls:
+            await asyncio.sleep(0)
+        assert scheduler.stats()["in_flight"] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The slot is free again, so the next call is admitted at once.
+        next_call = scheduler.arun(lambda: asyncio.sleep(0, "done"), 10)
+        assert await asyncio.wait_for(next_call, 1) == "done"
+
+    asyncio.run(main())
+    assert len(calls) == 1
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_stream_holds_its_slot_until_used_up_or_closed():
+    scheduler = LLMScheduler()
+    chunks = scheduler.stream(lambda: iter(["a", "b", "c"]), 10)
+    assert next(chunks) == "a"
+    assert scheduler.stats()["in_flight"] == 1
+    assert list(chunks) == ["b", "c"]
+    assert scheduler.stats()["in_flight"] == 0
+
+    chunks = scheduler.stream(lambda: iter(["a", "b"]), 10)
+    next(chunks)
+    chunks.close()
+    assert scheduler.stats()["in_flight"] == 0
@@ -0,0 +1,18 @@
+import pytest
+
+import storage
+from benchmarks.fakes import FakeS3
+from storage import ArtifactUploader
+
+
+def test_artifact_uploader_closes_when_the_build_fails(monkeypatch):
+    s3 = FakeS3()
+    monkeypatch.setattr(storage, "_client", s3)
+    artifacts = ArtifactUploader("bucket", "course", enabled=True)
+    with pytest.raises(RuntimeError):
+        with artifacts:
+            artifacts.put_json("outline.json", [])
+            raise RuntimeError("generation failed")
+    assert artifacts._executor._shutdown
+    artifacts.wait()
+    assert list(s3.objects) == [("bucket", "course/outline.json")]